@@ -11,7 +11,6 @@ setup(
         "python-dotenv",
         "requests",
         "ollama",
-        "numpy",
-        "nltk"
+        "numpy"
     ]
 ) 
\ No newline at end of file
@@ -1,25 +1,35 @@
+import asyncio
+import html
+import threading
+import time
 import streamlit as st
-from retriever import generate_response, search_documents, detect_language
-from indexer import index_document, load_documents
+from retriever import (
+    generate_response_stream, clean_ai_response, search_documents, detect_language, analyze_query, warm_up_model,
+    warm_up_models, build_bm25_index, to_source_view, SourceView, HNSW_EF_SEARCH
+)
+from indexer import index_document, index_documents, iter_upload, iter_documents, ensure_collections_once
 import ollama
 import os
-import nltk
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+@st.cache_resource
+def start_model_warmup():
+    """Load both response models once per server process, in the background so the UI paints immediately."""
+    thread = threading.Thread(target=warm_up_models, daemon=True)
+    thread.start()
+    return thread
+
 def setup_app():
     """Initialize app dependencies and configurations."""
-    # Download NLTK data if not already present
-    try:
-        nltk.data.find('tokenizers/punkt')
-    except LookupError:
-        nltk.download('punkt', quiet=True)
+    # Warm up the Arabic & English response models before the first query
+    start_model_warmup()
     
     # Initialize Qdrant collections
     try:
-        load_documents()  # This will set up collections if they don't exist
+        ensure_collections_once()  # Creates collections if they don't exist (once per server process)
     except Exception as e:
         st.error(f"Error initializing collections: {str(e)}")
 
@@ -45,6 +55,29 @@ if 'last_query' not in st.session_state:
     st.session_state.last_query = None
 if 'is_loading' not in st.session_state:
     st.session_state.is_loading = False
+if 'response_cache' not in st.session_state:
+    st.session_state.response_cache = {}
+
+# Maximum number of finished responses kept per session, and for how long (seconds)
+RESPONSE_CACHE_SIZE = 128
+RESPONSE_CACHE_TTL = 600
+
+@st.cache_resource
+def get_ollama_client():
+    """Get a cached Ollama client shared across reruns and sessions."""
+    return ollama.Client(host=os.getenv("OLLAMA_HOST", "http://localhost:11434"))
+
+@st.cache_resource
+def get_bm25_index(language: str):
+    """Build the BM25 index of a language collection once and share it across reruns."""
+    return build_bm25_index(language)
+
+@st.cache_data(ttl=300, max_entries=256, show_spinner=False)
+def cached_search(query: str, language: str, ef_search: int):
+    """Cache search results per (query, language, ef_search) with a bounded TTL cache."""
+    return search_documents(
+        query, language, ollama_client=get_ollama_client(), ef_search=ef_search, bm25_index=get_bm25_index(language)
+    )
 
 # Sidebar
 with st.sidebar:
@@ -54,35 +87,47 @@ with st.sidebar:
     st.subheader("Upload Documents")
     uploaded_file = st.file_uploader(
         "Choose a file",
-        type=['txt', 'pdf', 'docx', 'json', 'csv'],
-        help="Supported formats: TXT, PDF, DOCX, JSON, CSV"
+        type=['txt', 'json', 'csv'],
+        help="Supported formats: TXT, JSON, CSV"
     )
     
-    if uploaded_file:
+    # Index each uploaded file once, not again on every rerun
+    if uploaded_file and uploaded_file.file_id != st.session_state.get("indexed_file_id"):
         with st.spinner("Processing document..."):
             try:
-                # Save uploaded file temporarily
-                temp_path = f"temp_{uploaded_file.name}"
-                with open(temp_path, "wb") as f:
-                    f.write(uploaded_file.getvalue())
+                # Parse the uploaded bytes like the `data/` files (zero-copy buffer, no temp file round-trip)
+                documents = list(iter_upload(uploaded_file.getbuffer(), uploaded_file.name))
+                if not documents:
+                    raise ValueError("no text found in the file")
                 
-                # Index the document
-                index_document(temp_path)
+                if len(documents) == 1:
+                    # Detect the document language once from its beginning
+                    text = documents[0]["text"]
+                    index_document(text, uploaded_file.name, language=detect_language(text[:200]))
+                else:
+                    # JSON/CSV files with many documents go through the bulk pipeline (language per document)
+                    index_documents(documents)
                 st.success("✅ Document indexed successfully!")
                 st.session_state.documents_indexed = True
+                st.session_state.indexed_file_id = uploaded_file.file_id
                 
-                # Clean up temporary file
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
+                # New chunks invalidate the BM25 corpus and cached search results (the indexer clears the Qdrant query cache)
+                get_bm25_index.clear()
+                cached_search.clear()
+                st.session_state.response_cache.clear()
             except Exception as e:
                 st.error(f"❌ Error indexing document: {str(e)}")
 
     # Load Documents Button
-    if st.button("📂 Load Sample Documents", help="Load pre-indexed sample documents"):
+    if st.button("📂 Load Sample Documents", help="Index the sample documents in the data/ folder"):
         with st.spinner("Loading documents..."):
             try:
-                load_documents()
-                st.success("✅ Documents loaded successfully!")
+                # Stream the sample documents into the indexing pipeline (parsed in this process)
+                indexed = index_documents(iter_documents())
+                get_bm25_index.clear()
+                cached_search.clear()
+                st.session_state.response_cache.clear()
+                st.success(f"✅ Documents loaded successfully! ({indexed} chunks indexed)")
                 st.session_state.documents_indexed = True
             except Exception as e:
                 st.error(f"❌ Error loading documents: {str(e)}")
@@ -112,36 +157,105 @@ with st.sidebar:
 
 # Main Content
 
-# Search Input
-query = st.text_input(
-    "Ask a question:",
-    placeholder="e.g., What did Microsoft and OpenAI announce?",
-    key="search_input"
+# Search Form: widgets inside only trigger a rerun when the form is submitted
+with st.form("search_form"):
+    query = st.text_input(
+        "Ask a question:",
+        placeholder="e.g., What did Microsoft and OpenAI announce?",
+        key="search_input"
+    )
+    
+    with st.expander("⚙️ Search Settings"):
+        ef_search = st.slider(
+            "🎯 Search accuracy (HNSW ef)",
+            min_value=16,
+            max_value=512,
+            value=HNSW_EF_SEARCH,
+            step=8,
+            help="Candidates explored per query: higher values improve recall but slow down search"
+        )
+    
+    submitted = st.form_submit_button("🔍 Search", use_container_width=True, disabled=st.session_state.is_loading)
+
+# HTML templates built once and filled with str.format for every source/response
+RTL_TEMPLATE = "<div dir='rtl' style='text-align: right; font-family: Arial, sans-serif; line-height: 1.8;'>{}</div>"
+LTR_TEMPLATE = "<pre style='white-space: pre-wrap;'>{}</pre>"
+ENTITY_TEMPLATE = "<li>{}: {}</li>"
+ENTITIES_TEMPLATE = "<p><b>Named Entities:</b></p><ul dir='{}'>{}</ul>"
+SOURCE_TEMPLATE = (
+    "<details><summary>Source {index} (Relevance: {score:.2f})</summary>"
+    "<p><b>Document:</b> {source}<br><b>Language:</b> {emoji} {language}</p>"
+    "<p><b>Relevant Content:</b></p>{content}</details>"
 )
 
-@st.cache_resource
-def get_ollama_model():
-    """Get cached Ollama model instance."""
-    return ollama
-
-@st.cache_data
-def cached_search(query: str, language: str):
-    """Cache search results to prevent recomputation."""
-    return search_documents(query, language)
-
-@st.cache_data
-def cached_response(query: str, results: list):
-    """Cache AI responses to prevent recomputation."""
-    return generate_response(query, results)
-
-# Search Button
-if st.button("🔍 Search", use_container_width=True, disabled=st.session_state.is_loading):
+def render_source(i: int, source: SourceView) -> str:
+    """Render one retrieved source as a native collapsible <details> HTML block."""
+    is_arabic = source.language == "arabic"
+
+    # Add RTL support for Arabic source content
+    content = (RTL_TEMPLATE if is_arabic else LTR_TEMPLATE).format(html.escape(source.text))
+
+    entities = "".join(
+        ENTITY_TEMPLATE.format(html.escape(category), html.escape(', '.join(names)))
+        for category, names in source.entities_by_category
+    )
+    if entities:
+        content += ENTITIES_TEMPLATE.format("rtl" if is_arabic else "ltr", entities)
+
+    return SOURCE_TEMPLATE.format(
+        index=i,
+        score=source.score,
+        source=html.escape(source.source_name),
+        emoji="🇦🇪" if is_arabic else "🇺🇸",
+        language=source.language.capitalize(),
+        content=content
+    )
+
+async def search_with_warmup(query: str, language: str, ef_search: int):
+    """Search while the response model loads in Ollama."""
+    results, _ = await asyncio.gather(
+        asyncio.to_thread(cached_search, query, language, ef_search),
+        warm_up_model(language),
+    )
+    return results
+
+def render_response(query: str, language: str, ef_search: int, results: list):
+    """Stream the AI response on a cache miss, then keep the cleaned response in the session cache."""
+    cache = st.session_state.response_cache
+    cache_key = (query, language, ef_search)
+    cached = cache.get(cache_key)
+    # Entries are (stored_at, response) and expire after RESPONSE_CACHE_TTL
+    response = cached[1] if cached and time.monotonic() - cached[0] < RESPONSE_CACHE_TTL else None
+
+    if response is None:
+        stream = generate_response_stream(query, results, language=language, ollama_client=get_ollama_client())
+        placeholder = st.empty()
+        with placeholder.container():
+            raw_response = st.write_stream(stream)
+
+        # Materialize the stream once for the cache
+        response = clean_ai_response(raw_response, language)
+        cache.pop(cache_key, None)  # Re-insert an expired entry as the newest
+        cache[cache_key] = (time.monotonic(), response)
+        if len(cache) > RESPONSE_CACHE_SIZE:
+            cache.pop(next(iter(cache)))  # Evict the oldest entry
+
+        placeholder.empty()  # Swap the raw stream for the cleaned response, rendered exactly like a cache hit
+
+    # Add RTL support for Arabic responses
+    if language == "arabic":
+        st.markdown(RTL_TEMPLATE.format(response), unsafe_allow_html=True)
+    else:
+        st.write(response)
+
+# Search
+if submitted:
     if query:
         st.session_state.is_loading = True
         try:
             with st.spinner("🔍 Searching through documents..."):
-                # Detect language automatically
-                language = detect_language(query)
+                # Detect language automatically (query entities are extracted alongside and reused by the search)
+                language, _ = analyze_query(query)
                 
                 # Show detected language with appropriate emoji
                 lang_emoji = "🇺🇸" if language == "english" else "🇦🇪"
@@ -149,58 +263,18 @@ if st.button("🔍 Search", use_container_width=True, disabled=st.session_state.
                 st.info(f"{lang_emoji} Detected Language: {lang_display}")
                 
                 # Search for relevant documents
-                results = cached_search(query, language)
+                results = asyncio.run(search_with_warmup(query, language, ef_search))
                 
-                if results:
-                    with st.spinner("🤖 Generating response..."):
-                        response = cached_response(query, results)
-                        st.subheader("🤖 AI Response")
-                        
-                        # Add RTL support for Arabic responses
-                        if language == "arabic":
-                            st.markdown(f"""
-                            <div dir="rtl" style="text-align: right; font-family: 'Arial', sans-serif; line-height: 1.8;">
-                                {response}
-                            </div>
-                            """, unsafe_allow_html=True)
-                        else:
-                            st.write(response)
-                        
-                    # Display sources below the response
-                    st.subheader("📚 Sources")
-                    for i, doc in enumerate(results, 1):
-                        source_name = doc.get('source', 'Unknown').split('/')[-1] if doc.get('source') else 'Unknown'
-                        lang_emoji = "🇺🇸" if doc.get('language') == "english" else "🇦🇪"
-                        lang_display = doc.get('language', 'unknown').capitalize()
-                        
-                        # Add RTL support for Arabic source content
-                        with st.expander(f"Source {i} (Relevance: {doc['score']:.2f})"):
-                            st.write(f"**Document:** {source_name}")
-                            st.write(f"**Language:** {lang_emoji} {lang_display}")
-                            st.write("**Relevant Content:**")
-                            
-                            if doc.get('language') == "arabic":
-                                st.markdown(f"""
-                                <div dir="rtl" style="text-align: right; font-family: 'Arial', sans-serif; line-height: 1.8;">
-                                    {doc.get('text', 'No content available')}
-                                </div>
-                                """, unsafe_allow_html=True)
-                            else:
-                                st.markdown(f"```\n{doc.get('text', 'No content available')}\n```")
-                                
-                            if 'entities' in doc['matched_entities']:
-                                st.write("**Named Entities:**")
-                                for category, entities in doc['matched_entities'].items():
-                                    if doc.get('language') == "arabic":
-                                        st.markdown(f"""
-                                        <div dir="rtl" style="text-align: right;">
-                                            - {category}: {', '.join(entities)}
-                                        </div>
-                                        """, unsafe_allow_html=True)
-                                    else:
-                                        st.write(f"- {category}: {', '.join(entities)}")
-                else:
-                    st.warning("No relevant documents found. Try rephrasing your question or loading more documents.")
+            if results:
+                st.subheader("🤖 AI Response")
+                render_response(query, language, ef_search, results)
+                
+                # Display sources below the response (one markdown call for all sources)
+                st.subheader("📚 Sources")
+                sources = [to_source_view(doc) for doc in results]
+                st.markdown("\n".join(render_source(i, source) for i, source in enumerate(sources, 1)), unsafe_allow_html=True)
+            else:
+                st.warning("No relevant documents found. Try rephrasing your question or loading more documents.")
         except Exception as e:
             st.error(f"An error occurred: {str(e)}")
         finally:
@@ -1,15 +1,38 @@
 import os
 import uuid
+import pickle
+import hashlib
+import asyncio
 import json
 import csv
-import textwrap
+import io
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import ollama
+import queue
+import threading
 import numpy as np
-from qdrant_client import QdrantClient
-from qdrant_client.models import PointStruct, VectorParams
+from concurrent.futures import ThreadPoolExecutor
+from qdrant_client import QdrantClient, AsyncQdrantClient
+from qdrant_client.models import (
+    PointStruct, VectorParams, Datatype, HnswConfigDiff, OptimizersConfigDiff,
+    ScalarQuantization, ScalarQuantizationConfig, ScalarType, BinaryQuantization, BinaryQuantizationConfig
+)
 from dotenv import load_dotenv
-from typing import List, Dict, Any, Optional
+from functools import lru_cache
+from language_utils import is_arabic_fast
+from typing import List, Dict, Any, Optional, Union, Iterator, Iterable, Tuple
+
+try:
+    import fasttext  # Optional: local language identification
+except ImportError:
+    fasttext = None
+
+try:
+    import ijson  # Optional: streaming JSON parsing
+except ImportError:
+    ijson = None
 
 # Load environment variables
 load_dotenv()
@@ -21,10 +44,32 @@ load_dotenv()
 # Configuration from environment variables
 QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY", None)
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "true").lower() == "true"
 LANGUAGE_DETECTION_URL = os.getenv("LANGUAGE_DETECTION_URL", "http://localhost:5000/text/analytics/v3.1/languages")
 LANGUAGE_API_KEY = os.getenv("LANGUAGE_API_KEY")
 CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
-BATCH_SIZE = int(os.getenv("BATCH_SIZE", "10"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "100"))  # Characters shared by consecutive chunks
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", "256"))  # Points per Qdrant upsert
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))  # 32 for CPU/MPS, 128 for CUDA
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "bge-m3")
+CACHE_DIR = os.getenv("CACHE_DIR", ".cache")  # Language, entity and embedding caches reused across runs
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "4"))  # Match OLLAMA_NUM_PARALLEL
+HNSW_M = int(os.getenv("HNSW_M", "24"))
+HNSW_EF_CONSTRUCT = int(os.getenv("HNSW_EF_CONSTRUCT", "128"))
+QUANTIZATION = os.getenv("QUANTIZATION", "int8").lower()  # "int8" (4x smaller) or "binary" (32x smaller, needs rescoring)
+EMBEDDING_NUM_THREADS = int(os.getenv("EMBEDDING_NUM_THREADS", str(os.cpu_count() or 1)))
+INDEX_WORKERS = int(os.getenv("INDEX_WORKERS", "4"))  # Documents prepared concurrently during bulk indexing
+PIPELINE_QUEUE_SIZE = 64  # Items buffered between bulk-indexing stages
+DEFAULT_INDEXING_THRESHOLD = 20000  # Qdrant's default, restored after bulk loads
+UPSERT_CONCURRENCY = int(os.getenv("UPSERT_CONCURRENCY", "2"))  # Upsert requests in flight per upload
+LANGUAGE_DETECTOR = os.getenv("LANGUAGE_DETECTOR", "fasttext")  # "fasttext" (local, falls back to Azure) or "azure"
+FASTTEXT_MODEL_PATH = os.getenv("FASTTEXT_MODEL_PATH", "lid.176.ftz")
+LANGUAGE_BATCH_SIZE = 1000  # Azure Language API documents-per-request limit
+AZURE_WORKERS = int(os.getenv("AZURE_WORKERS", "4"))  # Concurrent Azure Language requests
+ENTITY_BATCH_SIZE = int(os.getenv("ENTITY_BATCH_SIZE", "5"))  # Azure NER documents-per-request limit (v3.1)
+LANGUAGE_SAMPLE_CHARS = 5120  # Azure Language API characters-per-document limit
 
 # Azure Language Service Configuration
 AZURE_LANGUAGE_ENDPOINT = os.getenv("AZURE_LANGUAGE_ENDPOINT")
@@ -37,88 +82,235 @@ if not AZURE_LANGUAGE_ENDPOINT or not AZURE_LANGUAGE_KEY:
 client = QdrantClient(
     url=QDRANT_URL,
     api_key=QDRANT_API_KEY,
+    grpc_port=QDRANT_GRPC_PORT,
+    prefer_grpc=QDRANT_PREFER_GRPC,  # Protobuf instead of JSON for 1024-dim vectors
+)
+
+# Shared HTTP session for Azure Language calls: keep-alive connections and retries on transient errors
+http_session = requests.Session()
+http_adapter = HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=32,
+    max_retries=Retry(total=3, backoff_factor=0.2, status_forcelist=(429, 500, 502, 503, 504), allowed_methods=None)
 )
+http_session.mount("http://", http_adapter)
+http_session.mount("https://", http_adapter)
+
+# Worker threads for concurrent Azure Language requests, reused across documents
+azure_pool = ThreadPoolExecutor(max_workers=AZURE_WORKERS)
+
+# Initialize Ollama client
+ollama_client = ollama.Client(host=OLLAMA_HOST, timeout=300)  # Large /api/embed batches can take minutes on CPU
+
+def load_language_model():
+    """Loads the local fasttext language-ID model, or returns None to detect languages with Azure."""
+    if LANGUAGE_DETECTOR != "fasttext" or fasttext is None:
+        return None
+    try:
+        return fasttext.load_model(FASTTEXT_MODEL_PATH)
+    except Exception as e:
+        print(f"⚠️ Local language model unavailable ({e}), using Azure Language Service")
+        return None
+
+# Initialize local language identification (lid.176)
+language_model = load_language_model()
 
 # Define embedding sizes based on model
 EMBEDDING_SIZE = 1024  # Both English & Arabic use bge-m3 (same dimension)
 
+# Use every CPU core for embedding inference on edge hosts
+EMBEDDING_OPTIONS = {"num_thread": EMBEDDING_NUM_THREADS}
+
 # ================================
 # 🔹 QDRANT COLLECTION SETUP
 # ================================
 
+# Qdrant collection per chunk language
+COLLECTIONS = {"english": "rag_docs_en", "arabic": "rag_docs_ar"}
+
+# Quantized copies of every vector, kept in RAM for search: int8 (4x smaller than float32) or binary (32x smaller)
+QUANTIZATION_CONFIG = BinaryQuantization(
+    binary=BinaryQuantizationConfig(always_ram=True)
+) if QUANTIZATION == "binary" else ScalarQuantization(
+    scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+)
+
 def create_collection_if_not_exists(client: QdrantClient, collection_name: str, vector_size: int = 1024) -> None:
-    """Creates a collection if it doesn't exist."""
+    """Creates a collection if it doesn't exist: float16 vectors memory-mapped on disk, quantized copies kept in RAM."""
     if not client.collection_exists(collection_name):
         client.create_collection(
             collection_name=collection_name,
-            vectors_config=VectorParams(size=vector_size, distance="Cosine")
+            vectors_config=VectorParams(size=vector_size, distance="Cosine", on_disk=True, datatype=Datatype.FLOAT16),
+            hnsw_config=HnswConfigDiff(m=HNSW_M, ef_construct=HNSW_EF_CONSTRUCT, on_disk=False),
+            quantization_config=QUANTIZATION_CONFIG
         )
         print(f"Created new collection '{collection_name}'")
+    elif type(client.get_collection(collection_name).config.quantization_config) is not type(QUANTIZATION_CONFIG):
+        # Older collections (or a changed QUANTIZATION): re-quantize in place instead of recreating them
+        client.update_collection(collection_name=collection_name, quantization_config=QUANTIZATION_CONFIG)
+        print(f"Enabled {QUANTIZATION} quantization on '{collection_name}'")
+
+def ensure_collections(client: QdrantClient) -> None:
+    """Creates the collection for each language if it doesn't exist (never drops existing data)."""
+    for collection_name in COLLECTIONS.values():
+        create_collection_if_not_exists(client, collection_name)
+    print("✅ Qdrant collections are now correctly set up!")
 
-# Create collections for both languages
-for lang in ["en", "ar"]:
-    collection_name = f"rag_docs_{lang}"
-    create_collection_if_not_exists(client, collection_name)
+# Semantic query caches kept by the retriever (one per language): stale as soon as new chunks are indexed
+QUERY_CACHE_COLLECTIONS = [f"query_cache_{language}" for language in COLLECTIONS]
 
-print("✅ Qdrant collections are now correctly set up!")
+def clear_query_caches(client: QdrantClient) -> None:
+    """Drops the retriever's cached query results, so searches see the chunks that were just indexed."""
+    for collection_name in QUERY_CACHE_COLLECTIONS:
+        try:
+            if client.collection_exists(collection_name):
+                client.delete_collection(collection_name)
+        except Exception as e:
+            print(f"Error clearing query cache '{collection_name}': {e}")
+
+@lru_cache(maxsize=None)
+def ensure_collections_once() -> None:
+    """Sets up the collections on the shared client the first time it's called in this process."""
+    ensure_collections(client)
 
 # ================================
-# 🔹 LANGUAGE DETECTION FUNCTION
+# 🔹 CONTENT-HASH CACHES
 # ================================
 
-def detect_language(text: str) -> str:
-    """Detects the language of a given text using Azure Language Service."""
+def text_digest(text: str) -> bytes:
+    """Content hash used as the key of the on-disk caches."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+def load_cache(name: str) -> Dict[bytes, Any]:
+    """Loads a cache saved by earlier runs from CACHE_DIR."""
     try:
-        # Remove trailing slash if present and add the correct path
-        base_endpoint = AZURE_LANGUAGE_ENDPOINT.rstrip('/')
-        endpoint = f"{base_endpoint}/text/analytics/v3.1/languages"
-        
-        headers = {
-            "Ocp-Apim-Subscription-Key": AZURE_LANGUAGE_KEY,
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "documents": [{
-                "id": "1",
-                "text": text
-            }]
-        }
+        with open(os.path.join(CACHE_DIR, f"{name}.pkl"), "rb") as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f"⚠️ Ignoring unreadable {name} cache: {e}")
+        return {}
 
-        response = requests.post(endpoint, headers=headers, json=payload)
-        response.raise_for_status()
-        
-        result = response.json()
-        if "documents" in result and result["documents"]:
-            detected_lang = result["documents"][0]["detectedLanguage"]["iso6391Name"]
-            return "arabic" if detected_lang == "ar" else "english"
-            
+def save_caches() -> None:
+    """Persists the language, entity and embedding caches so re-runs skip work already done."""
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        for name, cache in (("languages", language_cache), ("entities", entity_cache), ("embeddings", embedding_cache)):
+            with open(os.path.join(CACHE_DIR, f"{name}.pkl"), "wb") as f:
+                pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
     except Exception as e:
-        print(f"Error detecting language: {e}")
-    
-    return "english"  # Default to English if detection fails
+        print(f"Error saving caches: {e}")
+
+language_cache = load_cache("languages")  # text digest -> language
+entity_cache = load_cache("entities")  # "language:text" digest -> entities
+embedding_cache = load_cache("embeddings")  # chunk digest -> float32 embedding
+
+# ================================
+# 🔹 LANGUAGE DETECTION FUNCTION
+# ================================
+
+def detect_language(text: str) -> str:
+    """Detects the language of a given text locally with fasttext, else with Azure Language Service (cached by content hash)."""
+    return detect_language_batch([text])[0]
+
+def detect_language_batch(texts: List[str]) -> List[str]:
+    """Detects the language of many texts, only sending texts missing from the on-disk cache."""
+    digests = [text_digest(text) for text in texts]
+    missing = [i for i, digest in enumerate(digests) if digest not in language_cache]
+    if missing:
+        for i, language in zip(missing, detect_languages_uncached([texts[i] for i in missing])):
+            if language is not None:  # Failures aren't cached so the next run retries them
+                language_cache[digests[i]] = language
+
+    return [language_cache.get(digest, "english") for digest in digests]  # Default to English if detection fails
+
+def detect_languages_uncached(texts: List[str]) -> List[Optional[str]]:
+    """Detects the language of many texts locally, or with one Azure Language Service request per 1000 ambiguous texts."""
+    if language_model is not None:
+        try:
+            # fasttext predicts a whole list in-process; it only accepts single-line inputs
+            labels, _ = language_model.predict([text.replace("\n", " ") for text in texts], k=1)
+            return ["arabic" if label[0] == "__label__ar" else "english" for label in labels]
+        except Exception as e:
+            # e.g. fasttext 0.9.x with NumPy 2 ("copy=False" ValueError): use the local triage & Azure instead
+            print(f"⚠️ Local language detection failed ({e}), using Azure Language Service")
+
+    languages = [None] * len(texts)  # None for failed requests or missing ids
+
+    # Clearly Arabic or clearly non-Arabic texts are decided locally; only mixed ones go to Azure
+    ambiguous = []
+    for i, text in enumerate(texts):
+        arabic = is_arabic_fast(text)
+        if arabic is None:
+            ambiguous.append(i)
+        else:
+            languages[i] = "arabic" if arabic else "english"
+
+    base_endpoint = AZURE_LANGUAGE_ENDPOINT.rstrip('/')
+    endpoint = f"{base_endpoint}/text/analytics/v3.1/languages"
+    headers = {
+        "Ocp-Apim-Subscription-Key": AZURE_LANGUAGE_KEY,
+        "Content-Type": "application/json"
+    }
+
+    for start in range(0, len(ambiguous), LANGUAGE_BATCH_SIZE):
+        batch = ambiguous[start:start + LANGUAGE_BATCH_SIZE]
+        payload = {"documents": [{"id": str(i), "text": texts[i]} for i in batch]}
+        try:
+            response = http_session.post(endpoint, headers=headers, json=payload, timeout=10)
+            response.raise_for_status()
+
+            for doc in response.json().get("documents", []):
+                detected_lang = doc["detectedLanguage"]["iso6391Name"]
+                languages[int(doc["id"])] = "arabic" if detected_lang == "ar" else "english"
+        except Exception as e:
+            print(f"Error detecting languages: {e}")
+
+    return languages
 
 # ================================
 # 🔹 EMBEDDING GENERATION FUNCTION
 # ================================
 
-def generate_embedding(text: str, language: str) -> List[float]:
-    """Generates embeddings using bge-m3 for both Arabic & English."""
-    try:
-        response = ollama.embeddings(model="bge-m3", prompt=text)
-        embedding = response["embedding"]
+def fit_embedding_size(embedding: List[float]) -> np.ndarray:
+    """Pads or truncates an embedding so it matches the Qdrant vector size."""
+    return fit_embedding_sizes([embedding])[0]
 
-        # Ensure embedding size matches Qdrant vector size
-        if len(embedding) < EMBEDDING_SIZE:
-            embedding = np.pad(embedding, (0, EMBEDDING_SIZE - len(embedding)), 'constant', constant_values=0)
-        elif len(embedding) > EMBEDDING_SIZE:
-            embedding = embedding[:EMBEDDING_SIZE]  # Truncate if too large
+def fit_embedding_sizes(embeddings: List[List[float]]) -> np.ndarray:
+    """Copies a batch of embeddings into one preallocated (batch, EMBEDDING_SIZE) float32 buffer, padding or truncating."""
+    fitted = np.zeros((len(embeddings), EMBEDDING_SIZE), dtype=np.float32)
+    for row, embedding in zip(fitted, embeddings):
+        size = min(len(embedding), EMBEDDING_SIZE)
+        row[:size] = embedding[:size]
+    return fitted
 
-        return embedding
+def generate_embedding(text: str, language: str) -> Optional[np.ndarray]:
+    """Generates embeddings using bge-m3 for both Arabic & English."""
+    try:
+        response = ollama_client.embeddings(model=EMBEDDING_MODEL, prompt=text, options=EMBEDDING_OPTIONS)
+        return fit_embedding_size(response["embedding"])
     except Exception as e:
         print(f"Error generating embedding: {e}")
         return None
 
+def generate_embeddings_batch(texts: List[str]) -> List[Optional[np.ndarray]]:
+    """Generates bge-m3 embeddings for many texts in a single `/api/embed` request."""
+    try:
+        embeddings = ollama_client.embed(model=EMBEDDING_MODEL, input=texts, options=EMBEDDING_OPTIONS)["embeddings"]
+        if len(embeddings) == len(texts):
+            return list(fit_embedding_sizes(embeddings))  # Rows share the batch's single buffer
+        print(f"Batch embedding returned {len(embeddings)} vectors for {len(texts)} texts")
+    except Exception as e:
+        print(f"Error generating batch embeddings: {e}")
+
+    # Fall back to one `/api/embeddings` request per text (e.g. older Ollama servers)
+    return [generate_embedding(text, None) for text in texts]
+
+def chunk_digest(text: str) -> bytes:
+    """Content hash identifying a chunk's embedding (includes the model name)."""
+    return text_digest(f"{EMBEDDING_MODEL}:{text}")
+
 # ================================
 # 🔹 DOCUMENT PROCESSING FUNCTION
 # ================================
@@ -142,7 +334,7 @@ def extract_entities(text: str, language: str = "en") -> List[Dict[str, str]]:
             }]
         }
 
-        response = requests.post(endpoint, headers=headers, json=payload)
+        response = http_session.post(endpoint, headers=headers, json=payload, timeout=10)
         response.raise_for_status()
         
         result = response.json()
@@ -155,19 +347,91 @@ def extract_entities(text: str, language: str = "en") -> List[Dict[str, str]]:
     
     return []
 
-def process_document(text: str, filename: str = None) -> List[Dict[str, Any]]:
-    """Process a document and prepare it for indexing."""
+def extract_entities_batch(texts: List[str], languages: List[str]) -> List[List[Dict[str, str]]]:
+    """Extracts named entities for many texts, only sending texts missing from the on-disk cache."""
+    keys = [text_digest(f"{language}:{text}") for text, language in zip(texts, languages)]
+    missing = [i for i, key in enumerate(keys) if key not in entity_cache]
+    if missing:
+        found = extract_entities_uncached([texts[i] for i in missing], [languages[i] for i in missing])
+        for i, entities in zip(missing, found):
+            if entities is not None:  # Failures aren't cached so the next run retries them
+                entity_cache[keys[i]] = entities
+
+    return [entity_cache.get(key, []) for key in keys]
+
+def extract_entities_uncached(texts: List[str], languages: List[str]) -> List[Optional[List[Dict[str, str]]]]:
+    """Extracts named entities for many texts, sending ENTITY_BATCH_SIZE documents per Azure request (AZURE_WORKERS at a time)."""
+    entities = [None] * len(texts)  # None for failed requests or missing ids
+
+    base_endpoint = AZURE_LANGUAGE_ENDPOINT.rstrip('/')
+    endpoint = f"{base_endpoint}/text/analytics/v3.1/entities/recognition/general"
+    headers = {
+        "Ocp-Apim-Subscription-Key": AZURE_LANGUAGE_KEY,
+        "Content-Type": "application/json"
+    }
+
+    def extract(start: int) -> None:
+        payload = {"documents": [
+            {"id": str(i), "text": texts[i], "language": "ar" if languages[i] == "arabic" else "en"}
+            for i in range(start, min(start + ENTITY_BATCH_SIZE, len(texts)))
+        ]}
+        try:
+            response = http_session.post(endpoint, headers=headers, json=payload, timeout=10)
+            response.raise_for_status()
+
+            for doc in response.json().get("documents", []):
+                entities[int(doc["id"])] = [{"text": entity["text"], "category": entity["category"]}
+                                            for entity in doc["entities"]]
+        except Exception as e:
+            print(f"Error extracting entities: {e}")
+
+    # Send the sub-batches concurrently over the pooled session's keep-alive connections
+    list(azure_pool.map(extract, range(0, len(texts), ENTITY_BATCH_SIZE)))
+
+    return entities
+
+def chunk_text(text: str, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[str]:
+    """Splits text into windows of at most `size` characters overlapping by up to `overlap`, cut at whitespace when possible."""
+    chunks = []
+    start, length = 0, len(text)
+    while start < length:
+        end = min(start + size, length)
+        if end < length:
+            # Cut at the last space or newline in the second half of the window
+            cut = max(text.rfind(" ", start + size // 2, end), text.rfind("\n", start + size // 2, end))
+            if cut != -1:
+                end = cut
+
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= length:
+            break
+
+        # Step back by the overlap, starting the next window at a word boundary (and always moving forward)
+        space = text.find(" ", end - overlap, end)
+        next_start = space + 1 if space != -1 else end - overlap
+        start = next_start if next_start > start else end
+    return chunks
+
+def process_document(text: str, filename: str = None, language: Optional[str] = None,
+                     chunks: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Process a document and prepare it for indexing (a known document language skips per-chunk detection).
+    Pass `chunks` when the text was already split with chunk_text.
+    """
     # Split text into chunks
-    chunks = textwrap.wrap(text, CHUNK_SIZE) if text.strip() else []
+    if chunks is None:
+        chunks = chunk_text(text)
+    
+    # Detect every chunk's language in one batched request unless the document language is known
+    languages = [language] * len(chunks) if language else detect_language_batch(chunks)
+    
+    # Extract entities for every chunk with batched requests
+    chunk_entities = extract_entities_batch(chunks, languages)
     
     processed_chunks = []
-    for i, chunk in enumerate(chunks):
-        # Detect language for each chunk
-        language = detect_language(chunk)
-        
-        # Extract entities from the chunk
-        entities = extract_entities(chunk, language)
-        
+    for i, (chunk, chunk_language, entities) in enumerate(zip(chunks, languages, chunk_entities)):
         # Group entities by category
         entities_by_category = {}
         for entity in entities:
@@ -182,8 +446,10 @@ def process_document(text: str, filename: str = None) -> List[Dict[str, Any]]:
                 "chunk_id": i,
                 "total_chunks": len(chunks),
                 "source": filename or "unknown",
-                "language": language,
-                "entities": entities_by_category  # Store categorized entities
+                "language": chunk_language,
+                "entities": entities_by_category,  # Store categorized entities
+                # Lowercased once here so retrieval matches entities without re-lowercasing per query
+                "entities_lower": {category: [name.lower() for name in names] for category, names in entities_by_category.items()}
             }
         })
     
@@ -193,97 +459,356 @@ def process_document(text: str, filename: str = None) -> List[Dict[str, Any]]:
 # 🔹 DOCUMENT INDEXING FUNCTION
 # ================================
 
-def index_document(text: str, filename: str) -> None:
-    """Index a document into Qdrant."""
-    client = QdrantClient("localhost", port=6333)
-    
-    # Create collections for both languages if they don't exist
-    create_collection_if_not_exists(client, "rag_docs_en")
-    create_collection_if_not_exists(client, "rag_docs_ar")
-    print("✅ Qdrant collections are now correctly set up!")
-    
-    # Process the document into chunks
-    chunks = process_document(text, filename)
-    
-    # Prepare points for each language collection
-    en_points = []
-    ar_points = []
-    
-    for i, chunk in enumerate(chunks):
-        language = chunk["metadata"]["language"]
-        embedding = generate_embedding(chunk["text"], language)
-        
-        point = PointStruct(
-            id=i,
-            vector=embedding,
+# Namespace for deterministic point ids
+POINT_NAMESPACE = uuid.UUID("6f1c2a9e-3b5d-4e8f-9a7c-2d4b6e8f0a1c")
+
+# Marks the end of a bulk-indexing stage's output
+PIPELINE_DONE = object()
+
+def prefetch_embeddings(texts: List[str]) -> None:
+    """Embeds texts missing from the embedding cache so later embed_chunks calls are cache hits."""
+    missing = list({chunk_digest(text): text for text in texts if chunk_digest(text) not in embedding_cache}.items())
+    for start in range(0, len(missing), EMBED_BATCH_SIZE):
+        batch = missing[start:start + EMBED_BATCH_SIZE]
+        for (digest, _), embedding in zip(batch, generate_embeddings_batch([text for _, text in batch])):
+            if embedding is not None:
+                embedding_cache[digest] = embedding
+
+def point_id(chunk: Dict[str, Any]) -> int:
+    """Deterministic point id, so re-indexing the same chunk replaces its point instead of duplicating it."""
+    metadata = chunk["metadata"]
+    # Unsigned 64-bit ids: half the bytes of a UUID string on the wire and in Qdrant's id index
+    return uuid.uuid5(POINT_NAMESPACE, f"{metadata['language']}:{metadata['source']}:{chunk['text']}").int & ((1 << 64) - 1)
+
+def embed_chunks(chunks: List[Dict[str, Any]]) -> Iterator[PointStruct]:
+    """Embeds processed chunks in batches and yields a Qdrant point for each chunk that was embedded."""
+    def make_point(i: int, embedding: np.ndarray) -> PointStruct:
+        return PointStruct(
+            id=point_id(chunks[i]),
+            vector=embedding.tolist(),
             payload={
-                "text": chunk["text"],
-                "metadata": chunk["metadata"]
+                "text": chunks[i]["text"],
+                "metadata": chunks[i]["metadata"]
             }
         )
-        
-        if language == "arabic":
-            ar_points.append(point)
+
+    # Group duplicate chunks by content hash so each distinct text is embedded at most once
+    digests = [chunk_digest(chunk["text"]) for chunk in chunks]
+    chunks_by_digest = {}
+    for i, digest in enumerate(digests):
+        chunks_by_digest.setdefault(digest, []).append(i)
+
+    missing = []
+    for digest, chunk_ids in chunks_by_digest.items():
+        if digest in embedding_cache:
+            for i in chunk_ids:
+                yield make_point(i, embedding_cache[digest])
         else:
-            en_points.append(point)
+            missing.append(chunk_ids[0])
+
+    # Sort chunks by length so each batch pads to similar sizes
+    order = sorted(missing, key=lambda i: len(chunks[i]["text"]))
+
+    batches = [order[start:start + EMBED_BATCH_SIZE] for start in range(0, len(order), EMBED_BATCH_SIZE)]
+
+    # Keep several embed requests in flight so Ollama's parallel slots stay busy (results come back in order)
+    with ThreadPoolExecutor(max_workers=EMBED_WORKERS) as executor:
+        results = executor.map(lambda batch_ids: generate_embeddings_batch([chunks[i]["text"] for i in batch_ids]), batches)
+
+        for batch_ids, embeddings in zip(batches, results):
+            for i, embedding in zip(batch_ids, embeddings):
+                if embedding is None:
+                    continue
+
+                embedding_cache[digests[i]] = embedding
+                for duplicate in chunks_by_digest[digests[i]]:
+                    yield make_point(duplicate, embedding)
+
+def collection_for(point: PointStruct) -> str:
+    """Returns the language collection a point belongs in."""
+    return COLLECTIONS["arabic"] if point.payload["metadata"]["language"] == "arabic" else COLLECTIONS["english"]
+
+def point_batches(chunks: List[Dict[str, Any]]) -> Iterator[Tuple[str, List[PointStruct]]]:
+    """Embeds chunks into per-language buffers and yields (collection, points) each time a buffer reaches BATCH_SIZE."""
+    pending = {name: [] for name in COLLECTIONS.values()}
+    for point in embed_chunks(chunks):
+        name = collection_for(point)
+        pending[name].append(point)
+        if len(pending[name]) >= BATCH_SIZE:
+            yield name, pending[name]
+            pending[name] = []
+
+    for name, points in pending.items():
+        if points:
+            yield name, points
+
+async def upsert_batches(batches: Iterator[Tuple[str, List[PointStruct]]]) -> None:
+    """Upserts batches as they are produced, keeping up to UPSERT_CONCURRENCY requests in flight."""
+    async_client = AsyncQdrantClient(
+        url=QDRANT_URL, api_key=QDRANT_API_KEY, grpc_port=QDRANT_GRPC_PORT, prefer_grpc=QDRANT_PREFER_GRPC
+    )
+    in_flight = set()
+    try:
+        # Pull the next batch off the event loop so in-flight upserts progress while chunks are embedded
+        while (batch := await asyncio.to_thread(next, batches, None)) is not None:
+            if len(in_flight) >= UPSERT_CONCURRENCY:
+                done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    task.result()  # Surface upsert errors
+            name, points = batch
+            in_flight.add(asyncio.create_task(async_client.upsert(collection_name=name, points=points)))
+        await asyncio.gather(*in_flight)
+    finally:
+        await async_client.close()
+
+async def index_document_async(text: Union[str, bytes, memoryview], filename: str, language: Optional[str] = None) -> None:
+    """Index a document from inside a running event loop (blocking steps run in worker threads)."""
+    if not isinstance(text, str):
+        text = str(text, "utf-8")  # Decodes straight from the buffer; non-UTF-8 (binary) input raises
+
+    # Create collections for both languages if they don't exist (checked once per process)
+    await asyncio.to_thread(ensure_collections_once)
     
-    # Batch upsert points for each language
-    if en_points:
-        client.upsert(collection_name="rag_docs_en", points=en_points)
-    if ar_points:
-        client.upsert(collection_name="rag_docs_ar", points=ar_points)
+    # Embed the chunk texts while Azure detects languages and entities; embed_chunks then hits the cache
+    texts = chunk_text(text)  # Chunked once, shared by both steps
+    chunks, _ = await asyncio.gather(
+        asyncio.to_thread(process_document, text, filename, language, texts),
+        asyncio.to_thread(prefetch_embeddings, texts)
+    )
+    
+    # Upsert full per-language batches while the next chunks are still being embedded
+    await upsert_batches(point_batches(chunks))
+    await asyncio.to_thread(clear_query_caches, client)
+    await asyncio.to_thread(save_caches)
+
+def index_document(text: Union[str, bytes, memoryview], filename: str, language: Optional[str] = None) -> None:
+    """Index a document (text, or raw UTF-8 bytes such as an uploaded file's buffer) into Qdrant."""
+    asyncio.run(index_document_async(text, filename, language))
+
+def index_documents(documents: Iterable[Dict[str, Any]]) -> int:
+    """
+    Bulk-indexes documents as a pipeline: chunking, embedding and upserting run concurrently. Returns the number of points.
+    An error in any stage stops the whole pipeline and is re-raised here.
+    """
+    chunk_queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    point_queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    stop = threading.Event()  # Set when a stage fails (or the upsert loop exits) so every other stage winds down
+    errors = []  # Exceptions raised by the stage threads
+
+    def put(q: queue.Queue, item: Any) -> bool:
+        """Queues an item unless the pipeline is stopping; returns False if it was dropped."""
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(q: queue.Queue) -> Any:
+        """Takes the next item, or PIPELINE_DONE once the pipeline is stopping."""
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return PIPELINE_DONE
+
+    def prepare(doc: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Detects a document's language once and chunks it with entities."""
+        language = detect_language(doc["text"][:LANGUAGE_SAMPLE_CHARS])
+        return process_document(doc["text"], doc["filename"], language)
+
+    def chunk_stage() -> None:
+        """Prepares INDEX_WORKERS documents at a time and queues their chunks in document order."""
+        executor = ThreadPoolExecutor(max_workers=INDEX_WORKERS)
+        try:
+            for doc_number, chunks in enumerate(executor.map(prepare, documents), start=1):
+                print(f"📄 Processed document {doc_number} ({len(chunks)} chunks)")
+                for chunk in chunks:
+                    if not put(chunk_queue, chunk):
+                        return
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            executor.shutdown(cancel_futures=True)  # Documents not started yet are dropped when stopping
+            put(chunk_queue, PIPELINE_DONE)
+
+    def embed_stage() -> None:
+        """Embeds queued chunks in groups that fill every embedding worker, and queues the points."""
+        group = []
+        try:
+            while True:
+                chunk = get(chunk_queue)
+                if chunk is not PIPELINE_DONE:
+                    group.append(chunk)
+                if group and not stop.is_set() and (chunk is PIPELINE_DONE or len(group) >= EMBED_BATCH_SIZE * EMBED_WORKERS):
+                    points = embed_chunks(group)
+                    try:
+                        for point in points:
+                            if not put(point_queue, point):
+                                return
+                    finally:
+                        points.close()  # Waits for the embed requests already in flight
+                    group = []
+                if chunk is PIPELINE_DONE:
+                    return
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            put(point_queue, PIPELINE_DONE)
+
+    stages = [threading.Thread(target=chunk_stage, daemon=True), threading.Thread(target=embed_stage, daemon=True)]
+    for stage in stages:
+        stage.start()
+
+    # Upsert stage: buffer points per language and flush BATCH_SIZE at a time while later chunks are embedded
+    pending = {name: [] for name in COLLECTIONS.values()}
+    held = {name: [] for name in COLLECTIONS.values()}  # Latest full batch per collection, sent with the final flush
+    indexed = 0
+    try:
+        # Skip HNSW building while the bulk load runs, then build the index once at the end
+        for name in COLLECTIONS.values():
+            client.update_collection(collection_name=name, optimizers_config=OptimizersConfigDiff(indexing_threshold=0))
+
+        while (point := get(point_queue)) is not PIPELINE_DONE:
+            name = collection_for(point)
+            pending[name].append(point)
+            if len(pending[name]) >= BATCH_SIZE:
+                # Don't wait for Qdrant to apply each batch; it applies a collection's updates in order
+                if held[name]:
+                    client.upsert(collection_name=name, points=held[name], wait=False)
+                    indexed += len(held[name])
+                held[name], pending[name] = pending[name], []
+
+        if errors:
+            raise errors[0]  # A stage failed: don't report a partial load as a success
+
+        # Every collection that was written ends with a waiting upsert (its last full batch plus the remainder),
+        # so all the earlier wait=False batches have been applied when this returns
+        for name in COLLECTIONS.values():
+            points = held[name] + pending[name]
+            if points:
+                client.upsert(collection_name=name, points=points, wait=True)
+                indexed += len(points)
+
+        if indexed:
+            clear_query_caches(client)
+    finally:
+        # Stop and join the stages (also after an upsert error), then drop whatever they left queued
+        stop.set()
+        for stage in stages:
+            stage.join()
+        for q in (chunk_queue, point_queue):
+            while not q.empty():
+                q.get_nowait()
+
+        for name in COLLECTIONS.values():
+            client.update_collection(
+                collection_name=name,
+                optimizers_config=OptimizersConfigDiff(indexing_threshold=DEFAULT_INDEXING_THRESHOLD)
+            )
+        save_caches()
+
+    return indexed
 
 # ================================
 # 🔹 DOCUMENT LOADING FUNCTION
 # ================================
 
+# Formats understood by iter_file and iter_upload
+SUPPORTED_EXTENSIONS = (".txt", ".json", ".csv")
+
+def iter_json_documents(items: Iterable[Dict[str, Any]], file: str) -> Iterator[Dict[str, Any]]:
+    """Yields the non-empty `text` fields of a JSON array's items."""
+    for doc in items:
+        if "text" in doc and doc["text"].strip():
+            yield {"text": doc["text"], "filename": file}
+
+def iter_csv_documents(lines: Iterable[str], file: str) -> Iterator[Dict[str, Any]]:
+    """Yields the non-empty `text` column of CSV rows (assuming columns: text, lang), read positionally once the header is known."""
+    reader = csv.reader(lines)
+    header = next(reader, [])
+    if "text" not in header:
+        return
+    text_column = header.index("text")
+    for row in reader:
+        if len(row) > text_column and row[text_column].strip():
+            yield {"text": row[text_column], "filename": file}
+
+def iter_file(file_path: str) -> Iterator[Dict[str, Any]]:
+    """Yields the documents in one text, JSON, or CSV file as they are parsed."""
+    file = os.path.basename(file_path)
+
+    # Load text files
+    if file.endswith(".txt"):
+        with open(file_path, "r", encoding="utf-8") as f:
+            text = f.read()
+            if text.strip():
+                yield {"text": text, "filename": file}
+
+    # Load JSON files (streamed item by item when ijson is installed)
+    elif file.endswith(".json"):
+        with open(file_path, "rb") as f:
+            yield from iter_json_documents(ijson.items(f, "item") if ijson is not None else json.load(f), file)
+
+    # Load CSV files
+    elif file.endswith(".csv"):
+        with open(file_path, "r", encoding="utf-8", newline="", buffering=1 << 20) as f:
+            yield from iter_csv_documents(f, file)
+
+def iter_upload(data: Union[bytes, memoryview], filename: str) -> Iterator[Dict[str, Any]]:
+    """
+    Yields the documents of an uploaded text, JSON, or CSV file, parsed like the files in `data/`.
+    Raises ValueError for other formats and UnicodeDecodeError for content that isn't UTF-8.
+    """
+    if not filename.lower().endswith(SUPPORTED_EXTENSIONS):
+        raise ValueError(f"Unsupported file type: {filename}")
+    text = str(data, "utf-8")  # Strict: binary content is rejected instead of being indexed as noise
+
+    if filename.lower().endswith(".json"):
+        yield from iter_json_documents(json.loads(text), filename)
+    elif filename.lower().endswith(".csv"):
+        yield from iter_csv_documents(io.StringIO(text, newline=""), filename)
+    elif text.strip():
+        yield {"text": text, "filename": filename}
+
+def load_file(file_path: str) -> List[Dict[str, Any]]:
+    """Loads the documents in one text, JSON, or CSV file."""
+    return list(iter_file(file_path))
+
+def data_files() -> List[str]:
+    """Paths of the regular files in the `data/` folder."""
+    with os.scandir("data") as entries:
+        return [entry.path for entry in entries if entry.is_file()]
+
+def iter_documents() -> Iterator[Dict[str, Any]]:
+    """Streams documents from the `data/` folder one at a time, without holding the corpus in memory."""
+    for file_path in data_files():
+        yield from iter_file(file_path)
+
 def load_documents() -> List[Dict[str, Any]]:
-    """Loads text, JSON, and CSV documents from the `data/` folder."""
-    documents = []
-
-    for file in os.listdir("data"):
-        file_path = os.path.join("data", file)
-
-        # Load text files
-        if file.endswith(".txt"):
-            with open(file_path, "r", encoding="utf-8") as f:
-                text = f.read()
-                if text.strip():
-                    documents.append({"text": text, "filename": file})
-
-        # Load JSON files
-        elif file.endswith(".json"):
-            with open(file_path, "r", encoding="utf-8") as f:
-                json_data = json.load(f)
-                for doc in json_data:
-                    if "text" in doc and doc["text"].strip():
-                        documents.append({"text": doc["text"], "filename": file})
-
-        # Load CSV files (assuming columns: text, lang)
-        elif file.endswith(".csv"):
-            with open(file_path, "r", encoding="utf-8") as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if "text" in row and row["text"].strip():
-                        documents.append({"text": row["text"], "filename": file})
-
-    return documents
+    """Loads text, JSON, and CSV documents from the `data/` folder (prefer `iter_documents` to stream them)."""
+    return list(iter_documents())
 
 # ================================
 # 🔹 MAIN EXECUTION
 # ================================
 
-if __name__ == "__main__":
-    documents = load_documents()
+def main() -> None:
+    """Indexes every document in the `data/` folder."""
+    ensure_collections_once()
 
-    if not documents:
-        print("⚠️ No documents to index. Exiting...")
-        exit()
+    # Stream documents straight into the indexing pipeline
+    total_points = index_documents(iter_documents())
 
-    # Process each document
-    total_docs = len(documents)
-    for i, doc in enumerate(documents, start=1):
-        print(f"📄 Processing document {i}/{total_docs}...")
-        index_document(doc["text"], doc["filename"])
+    if not total_points:
+        print("⚠️ No documents to index.")
+        return
 
-    print(f"✅ Successfully indexed {total_docs} documents from `data/` folder!")
\ No newline at end of file
+    print(f"✅ Successfully indexed {total_points} chunks from `data/` folder!")
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,10 @@
 import os
+import re
 from functools import lru_cache
 from typing import Dict, List, Optional, Union
 import requests
+from requests.adapters import HTTPAdapter
+import numpy as np
 from datetime import datetime
 import json
 
@@ -13,6 +16,43 @@ AZURE_LANGUAGE_KEY = os.getenv("AZURE_LANGUAGE_KEY")
 LANGUAGE_CACHE_SIZE = 1000
 ENTITY_CACHE_SIZE = 1000
 
+# Shared keep-alive session for Azure Language calls
+http_session = requests.Session()
+http_session.mount("http://", HTTPAdapter(pool_connections=16, pool_maxsize=16))
+http_session.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=16))
+
+# Arabic Unicode block, compiled once
+_ARABIC_RE = re.compile(r'[\u0600-\u06FF]')
+
+def is_arabic(text: str, threshold: float = 0.1) -> bool:
+    """
+    Local Arabic-script check on the first 512 characters, without any network call.
+    Returns True when Arabic characters make up more than `threshold` of the sample.
+    """
+    sample = text[:512]
+    if sample.isascii():  # Pure ASCII (obvious English) is decided in C without scanning
+        return False
+    return len(_ARABIC_RE.findall(sample)) / max(len(sample), 1) > threshold
+
+def is_arabic_fast(text: str) -> Optional[bool]:
+    """
+    Local triage for batch language detection: True/False when the first 4096 characters are clearly
+    Arabic (> 60% Arabic script) or clearly not (< 5%), None when the text is mixed and needs a real detector.
+    """
+    if text.isascii():
+        return False
+    # One vectorized pass over the code points instead of a Python loop per character
+    codes = np.frombuffer(text[:4096].encode("utf-32-le"), dtype=np.uint32)
+    codes = codes[codes > 0x20]  # Ignore whitespace & control characters
+    if codes.size == 0:
+        return None
+    ratio = np.count_nonzero((codes >= 0x0600) & (codes <= 0x06FF)) / codes.size
+    if ratio > 0.6:
+        return True
+    if ratio < 0.05:
+        return False
+    return None
+
 @lru_cache(maxsize=LANGUAGE_CACHE_SIZE)
 def detect_language(text: str) -> str:
     """
@@ -37,7 +77,7 @@ def detect_language(text: str) -> str:
         }
         
         # Make the request with timeout
-        response = requests.post(url, headers=headers, json=body, timeout=5)
+        response = http_session.post(url, headers=headers, json=body, timeout=5)
         response.raise_for_status()
         
         result = response.json()
@@ -54,8 +94,7 @@ def detect_language(text: str) -> str:
     except Exception as e:
         print(f"Language detection error: {e}")
         # Fallback to simple heuristic
-        arabic_chars = sum(1 for c in text if '\u0600' <= c <= '\u06FF')
-        return "arabic" if arabic_chars > len(text) * 0.5 else "english"
+        return "arabic" if is_arabic(text, threshold=0.5) else "english"
 
 @lru_cache(maxsize=ENTITY_CACHE_SIZE)
 def extract_entities(text: str, language: str) -> List[Dict[str, str]]:
@@ -81,7 +120,7 @@ def extract_entities(text: str, language: str) -> List[Dict[str, str]]:
         }
         
         # Make the request with timeout
-        response = requests.post(url, headers=headers, json=body, timeout=5)
+        response = http_session.post(url, headers=headers, json=body, timeout=5)
         response.raise_for_status()
         
         result = response.json()
@@ -1,24 +1,52 @@
 import os
 import re
+import time
+import uuid
+import pickle
+import hashlib
+import unicodedata
+import atexit
 import requests
 import ollama
 import numpy as np
-import nltk
-import string
 from qdrant_client import QdrantClient
+from qdrant_client.models import (
+    SearchParams, QueryRequest, QuantizationSearchParams, Prefetch, VectorParams, PointStruct,
+    Filter, FieldCondition, MatchValue, Range, FilterSelector
+)
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from rank_bm25 import BM25Okapi
-from nltk.tokenize import word_tokenize
 from dotenv import load_dotenv
-from typing import List, Dict, Any
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from language_utils import is_arabic
+from typing import List, Dict, Any, Collection, Optional, Iterator, NamedTuple, Sequence, Tuple
+
+try:
+    import spacy  # Optional: local named-entity recognition
+except ImportError:
+    spacy = None
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Download required NLTK data
-nltk.download("punkt")
-
-# ✅ Initialize Qdrant client
-client = QdrantClient("localhost", port=6333)
+# ✅ Initialize Qdrant client (gRPC: query vectors travel as protobuf floats instead of JSON text)
+QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
+QDRANT_API_KEY = os.getenv("QDRANT_API_KEY", None)
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "true").lower() == "true"
+client = QdrantClient(
+    url=QDRANT_URL,
+    api_key=QDRANT_API_KEY,
+    grpc_port=QDRANT_GRPC_PORT,
+    prefer_grpc=QDRANT_PREFER_GRPC,
+    timeout=10
+)
+
+# ✅ Initialize Ollama client (shared by embeddings & chat, callers may inject their own)
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+default_ollama_client = ollama.Client(host=OLLAMA_HOST)
 
 # ✅ Define embedding sizes for models
 EMBEDDING_SIZES = {
@@ -26,19 +54,90 @@ EMBEDDING_SIZES = {
     "arabic": 1024,   # bge-m3 embeddings
 }
 
+# ✅ Embedding model (any bge-m3 build served by Ollama) & CPU threads used for inference
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "bge-m3")
+EMBEDDING_OPTIONS = {"num_thread": int(os.getenv("EMBEDDING_NUM_THREADS", str(os.cpu_count() or 1)))}
+
+# ✅ Number of distinct (normalized) queries whose embeddings are kept in memory
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "4096"))
+
+# ✅ Semantic query cache: near-duplicate queries (cosine >= threshold) reuse earlier results for a while
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_TTL = int(os.getenv("SEMANTIC_CACHE_TTL", "3600"))
+SEMANTIC_CACHE_SWEEP_INTERVAL = int(os.getenv("SEMANTIC_CACHE_SWEEP_INTERVAL", "300"))  # Seconds between expiry sweeps
+QUERY_CACHE_NAMESPACE = uuid.UUID("5a1c0b9e-6f2d-4c84-9d0e-3b7f2a41c6e8")
+
+# ✅ HNSW candidate list size at query time (higher = better recall, slower search)
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "100"))
+
+# ✅ Response model per language
+LLM_MODELS = {
+    "arabic": "gemma3:1b",
+    "english": "phi4-mini:3.8b",
+}
+
+# ✅ Candidates prefetched from the quantized (in-RAM) index before the full-precision rescoring pass
+PREFETCH_LIMIT = int(os.getenv("PREFETCH_LIMIT", "100"))
+
+# ✅ Weight of the (max-normalized) BM25 keyword score in the hybrid ranking
+BM25_WEIGHT = float(os.getenv("BM25_WEIGHT", "0.3"))
+
+# ✅ How long Ollama keeps a response model loaded after its last request
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "1h")
+
+# ✅ Where the BM25 index is persisted between restarts (shared with the indexer's caches)
+CACHE_DIR = os.getenv("CACHE_DIR", ".cache")
+
+# ✅ Language detection: query prefix sent to Azure & number of prefixes remembered
+LANGUAGE_SAMPLE_CHARS = 200
+LANGUAGE_CACHE_SIZE = 8192
+
+# ✅ Number of retrieved chunks passed to the LLM as context
+MAX_CONTEXT_DOCS = 5
+
 # ✅ Azure AI Language Service Configuration
 AZURE_LANGUAGE_ENDPOINT = os.getenv("AZURE_LANGUAGE_ENDPOINT")
 AZURE_LANGUAGE_KEY = os.getenv("AZURE_LANGUAGE_KEY")
 
+# ✅ Local spaCy NER pipelines tried before Azure (empty name = Azure only for that language)
+SPACY_MODELS = {
+    "english": os.getenv("SPACY_MODEL_EN", "en_core_web_sm"),
+    "arabic": os.getenv("SPACY_MODEL_AR", ""),
+}
+
 if not AZURE_LANGUAGE_ENDPOINT or not AZURE_LANGUAGE_KEY:
     raise ValueError("Azure Language Service configuration missing. Please set AZURE_LANGUAGE_ENDPOINT and AZURE_LANGUAGE_KEY environment variables.")
 
+# ✅ Shared HTTP session for Azure Language calls: keep-alive connections instead of a TLS handshake per query
+http_session = requests.Session()
+http_adapter = HTTPAdapter(
+    pool_connections=40,
+    pool_maxsize=40,
+    max_retries=Retry(total=3, backoff_factor=0.2, status_forcelist=(429, 500, 502, 503, 504), allowed_methods=None)
+)
+http_session.mount("http://", http_adapter)
+http_session.mount("https://", http_adapter)
+atexit.register(http_session.close)
+
+# ✅ Worker threads overlapping a query's independent network calls (Azure entities vs. embedding & search)
+query_pool = ThreadPoolExecutor(max_workers=8)
+
 # -----------------------------------------------
 # 🔹 Function: Detect Query Language
 # -----------------------------------------------
 
 def detect_language(text):
-    """Detects the language of a given query using Azure Language Service."""
+    """Detects the language of a given query using Azure Language Service (memoized per query prefix)."""
+    # The first LANGUAGE_SAMPLE_CHARS characters are enough to tell Arabic from English
+    return _detect_language_cached(text[:LANGUAGE_SAMPLE_CHARS].strip())
+
+@lru_cache(maxsize=LANGUAGE_CACHE_SIZE)
+def _detect_language_cached(text):
+    """Detects the language of a (stripped) query prefix, calling Azure only when there is little Arabic script."""
+    # Arabic script is enough to decide for this bilingual app: skip the HTTP round-trip
+    if is_arabic(text):
+        return "arabic"
     
     # Remove trailing slash if present and add the correct path
     base_endpoint = AZURE_LANGUAGE_ENDPOINT.rstrip('/')
@@ -60,7 +159,7 @@ def detect_language(text):
 
     try:
         print("Making request to Azure...")  # Debug print
-        response = requests.post(endpoint, headers=headers, json=payload)
+        response = http_session.post(endpoint, headers=headers, json=payload, timeout=10)
         print(f"Response status: {response.status_code}")  # Debug print
         response.raise_for_status()
         response_json = response.json()
@@ -82,201 +181,648 @@ def detect_language(text):
 # 🔹 Function: Generate Query Embeddings
 # -----------------------------------------------
 
-def generate_embedding(text, language):
-    """Generates embeddings using different models for Arabic & English queries."""
-    model_name = "bge-m3" if language == "arabic" else "bge-m3"
-    
-    response = ollama.embeddings(model=model_name, prompt=text)
-    embedding = response["embedding"]
+def normalize_query(text: str) -> str:
+    """NFKC-normalizes, lowercases and collapses whitespace so equivalent queries share one embedding."""
+    return " ".join(unicodedata.normalize("NFKC", text).lower().split())
 
+def fit_embeddings(embeddings, language: str) -> np.ndarray:
+    """Pads/truncates embedding rows to the size expected by Qdrant in one preallocated (N, size) buffer."""
     # ✅ Fix: Ensure embedding size matches Qdrant expectations
     expected_size = EMBEDDING_SIZES[language]
-
-    # 🔹 Ensure embedding has the correct size
-    if len(embedding) < expected_size:
-        embedding = np.pad(embedding, (0, expected_size - len(embedding)), 'constant')
-    elif len(embedding) > expected_size:
-        embedding = embedding[:expected_size]  # Truncate if larger
-
-    return list(embedding)  # ✅ FIXED: Returning as list directly
+    if all(len(embedding) == expected_size for embedding in embeddings):
+        fitted = np.array(embeddings, dtype=np.float32)  # bge-m3 already matches: one conversion, no padding
+    else:
+        fitted = np.zeros((len(embeddings), expected_size), dtype=np.float32)
+        for row, embedding in zip(fitted, embeddings):
+            n = min(len(embedding), expected_size)
+            row[:n] = embedding[:n]
+    fitted.setflags(write=False)  # Shared between callers (and the query cache): never modified in place
+    return fitted
+
+def generate_embeddings_batch(texts: List[str], language: str,
+                              ollama_client: Optional[ollama.Client] = None) -> np.ndarray:
+    """Embeds several queries in one /api/embed request, returned as an (N, size) float32 array."""
+    ollama_client = ollama_client or default_ollama_client
+    try:
+        response = ollama_client.embed(model=EMBEDDING_MODEL, input=texts, options=EMBEDDING_OPTIONS)
+        embeddings = response["embeddings"]
+    except Exception as e:
+        print(f"Batch embedding error, falling back to one request per query: {e}")
+        embeddings = [
+            ollama_client.embeddings(model=EMBEDDING_MODEL, prompt=text, options=EMBEDDING_OPTIONS)["embedding"]
+            for text in texts
+        ]
+    return fit_embeddings(embeddings, language)
+
+@lru_cache(maxsize=QUERY_EMBEDDING_CACHE_SIZE)
+def _embed_cached(text: str, language: str, ollama_client: ollama.Client) -> np.ndarray:
+    """Embeds a normalized query once; repeats are served from memory (see `_embed_cached.cache_info()`)."""
+    return generate_embeddings_batch([text], language, ollama_client)[0]
+
+def generate_embedding(text, language, ollama_client: Optional[ollama.Client] = None) -> np.ndarray:
+    """Generates query embeddings with the shared bge-m3 model for Arabic & English (cached per normalized query)."""
+    return _embed_cached(normalize_query(text), language, ollama_client or default_ollama_client)
 
 # -----------------------------------------------
 # 🔹 Function: Tokenize Text for BM25
 # -----------------------------------------------
 
+# Compiled once: Unicode word characters cover Arabic & English, punctuation is never a token
+# Letters & digits (\w minus "_", which is punctuation) plus Arabic diacritics (harakat, dagger alif),
+# which \w alone treats as word breaks
+_TOKEN_RE = re.compile(r"(?:[^\W_]|[\u064B-\u065F\u0670])+", re.UNICODE)
+
 def tokenize_text(text, language):
-    """Tokenizes input text for BM25 retrieval, handling Arabic separately."""
-    if language == "arabic":
-        return word_tokenize(text)  # Arabic tokenization (better for BM25)
-    return [word.lower() for word in word_tokenize(text) if word not in string.punctuation]
+    """Tokenizes input text for BM25 retrieval (lowercased words, no punctuation)."""
+    return _TOKEN_RE.findall(text.lower())
+
+# -----------------------------------------------
+# 🔹 Function: Build BM25 Index
+# -----------------------------------------------
+
+def collection_digest(collection_name: str) -> bytes:
+    """Digest of every point id in a collection: ids derive from chunk content, so it changes whenever the chunks do."""
+    digest = hashlib.blake2b(digest_size=16)
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            limit=10000,
+            offset=offset,
+            with_payload=False,
+            with_vectors=False
+        )
+        for point in points:
+            digest.update(str(point.id).encode("ascii") + b",")
+        if offset is None:
+            return digest.digest()
+
+def build_bm25_index(language: str) -> Optional[Dict[str, Any]]:
+    """Builds a BM25 index once over every chunk stored in the language collection (reused from disk if unchanged)."""
+    collection_name = "rag_docs_ar" if language == "arabic" else "rag_docs_en"
+    if not client.collection_exists(collection_name):
+        return None
+
+    # A pickled index is reused across restarts as long as the collection holds the same chunks
+    points_digest = collection_digest(collection_name)
+    cache_path = os.path.join(CACHE_DIR, f"bm25_{collection_name}.pkl")
+    try:
+        with open(cache_path, "rb") as f:
+            cached = pickle.load(f)
+        if cached.get("points_digest") == points_digest and cached.get("tokenizer") == _TOKEN_RE.pattern:
+            return cached["index"]
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"Ignoring unreadable BM25 cache: {e}")
+
+    point_ids, corpus = [], []
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            limit=1000,
+            offset=offset,
+            with_payload=["text"],
+            with_vectors=False
+        )
+        for point in points:
+            point_ids.append(point.id)
+            corpus.append(tokenize_text(point.payload.get("text", ""), language))
+        if offset is None:
+            break
+
+    if not corpus:
+        return None
+
+    # Map Qdrant point ids to BM25 corpus positions so vector hits can be scored directly
+    index = {"bm25": BM25Okapi(corpus), "positions": {point_id: i for i, point_id in enumerate(point_ids)}}
+
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(cache_path, "wb") as f:
+            pickle.dump({"points_digest": points_digest, "tokenizer": _TOKEN_RE.pattern, "index": index}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        print(f"Error saving BM25 cache: {e}")
+
+    return index
 
 # -----------------------------------------------
 # 🔹 Function: Extract Entities
 # -----------------------------------------------
 
+# spaCy labels mapped to the Azure categories stored in the index, so local & indexed entities match
+SPACY_CATEGORIES = {
+    "PERSON": "Person", "NORP": "PersonType", "ORG": "Organization", "GPE": "Location", "LOC": "Location",
+    "FAC": "Location", "PRODUCT": "Product", "EVENT": "Event", "DATE": "DateTime", "TIME": "DateTime",
+    "PERCENT": "Quantity", "MONEY": "Quantity", "QUANTITY": "Quantity", "CARDINAL": "Quantity", "ORDINAL": "Quantity",
+}
+
+def load_ner_models() -> Dict[str, Any]:
+    """Loads the configured spaCy pipelines (NER only); languages without one use Azure."""
+    models = {}
+    if spacy is None:
+        return models
+    for language, model_name in SPACY_MODELS.items():
+        if not model_name:
+            continue
+        try:
+            models[language] = spacy.load(model_name, disable=["parser", "tagger", "lemmatizer", "attribute_ruler"])
+        except Exception as e:
+            print(f"⚠️ Local NER model '{model_name}' unavailable ({e}), using Azure Language Service")
+    return models
+
+# Initialize local NER (spaCy)
+ner_models = load_ner_models()
+
+def extract_entities_local(nlp, text: str) -> List[Dict[str, str]]:
+    """Extracts named entities in-process with a spaCy pipeline, using Azure category names."""
+    return [
+        {"text": ent.text, "category": SPACY_CATEGORIES.get(ent.label_, ent.label_)}
+        for ent in nlp(text).ents
+    ]
+
 def extract_entities(text: str, language: str = "en") -> List[Dict[str, str]]:
-    """Extract named entities from text using Azure Language Service."""
+    """Extract named entities from text with local spaCy NER or Azure Language Service (memoized per text & language)."""
     try:
-        base_endpoint = AZURE_LANGUAGE_ENDPOINT.rstrip('/')
-        endpoint = f"{base_endpoint}/text/analytics/v3.1/entities/recognition/general"
-        
-        headers = {
-            "Ocp-Apim-Subscription-Key": AZURE_LANGUAGE_KEY,
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "documents": [{
-                "id": "1",
-                "text": text,
-                "language": "ar" if language == "arabic" else "en"
-            }]
-        }
-
-        response = requests.post(endpoint, headers=headers, json=payload)
-        response.raise_for_status()
-        
-        result = response.json()
-        if "documents" in result and result["documents"]:
-            return [{"text": entity["text"], "category": entity["category"]} 
-                   for entity in result["documents"][0]["entities"]]
-            
+        return _extract_entities_cached(text, "arabic" if language == "arabic" else "english")
     except Exception as e:
         print(f"Error extracting entities: {e}")
     
     return []
 
+@lru_cache(maxsize=LANGUAGE_CACHE_SIZE)
+def _extract_entities_cached(text: str, language: str) -> List[Dict[str, str]]:
+    """Runs local NER when available, Azure otherwise; errors propagate, so failed requests aren't memoized."""
+    nlp = ner_models.get(language)
+    if nlp is not None:
+        entities = extract_entities_local(nlp, text)
+        # Short queries without entities are taken as they are; longer ones get a second opinion from Azure
+        if entities or len(text.split()) <= 3:
+            return entities
+    return extract_entities_azure(text, language)
+
+def extract_entities_azure(text: str, language: str) -> List[Dict[str, str]]:
+    """Calls Azure NER for one text (raises on request errors)."""
+    base_endpoint = AZURE_LANGUAGE_ENDPOINT.rstrip('/')
+    endpoint = f"{base_endpoint}/text/analytics/v3.1/entities/recognition/general"
+    
+    headers = {
+        "Ocp-Apim-Subscription-Key": AZURE_LANGUAGE_KEY,
+        "Content-Type": "application/json"
+    }
+    
+    payload = {
+        "documents": [{
+            "id": "1",
+            "text": text,
+            "language": "ar" if language == "arabic" else "en"
+        }]
+    }
+
+    response = http_session.post(endpoint, headers=headers, json=payload, timeout=10)
+    response.raise_for_status()
+    
+    result = response.json()
+    if "documents" in result and result["documents"]:
+        return [{"text": entity["text"], "category": entity["category"]} 
+               for entity in result["documents"][0]["entities"]]
+    return []
+
+def analyze_query(query: str) -> Tuple[str, List[Dict[str, str]]]:
+    """
+    Detects the query language and extracts its entities with overlapping Azure requests.
+    Non-Arabic-script queries are almost always English here, so English NER runs alongside detection
+    (and is redone only if Azure says Arabic). Results are memoized, so `search_documents` reuses them.
+    """
+    prefix = query[:LANGUAGE_SAMPLE_CHARS].strip()
+    if is_arabic(prefix):
+        return "arabic", extract_entities(query, "arabic")
+
+    entities_future = query_pool.submit(extract_entities, query, "english")
+    language = detect_language(query)
+    if language != "english":
+        entities_future.cancel()
+        return language, extract_entities(query, language)
+    return language, entities_future.result()
+
 # -----------------------------------------------
 # 🔹 Function: Calculate Entity Score
 # -----------------------------------------------
 
-def calculate_entity_score(query_entities: List[Dict[str, str]], doc_entities: Dict[str, List[str]]) -> float:
-    """Calculate similarity score based on matching entities."""
-    if not query_entities or not doc_entities:
+def lower_entities(doc_entities: Dict[str, List[str]]) -> Dict[str, List[str]]:
+    """Lowercased entities per category (stored at index time as `entities_lower`; rebuilt for older payloads)."""
+    return {category: [e.lower() for e in entities] for category, entities in doc_entities.items()}
+
+def hit_entities_lower(metadata: Dict[str, Any]) -> Dict[str, List[str]]:
+    """Lowercased entities of a hit, precomputed by the indexer when available."""
+    if "entities_lower" in metadata:
+        return metadata["entities_lower"]
+    return lower_entities(metadata.get("entities", {}))
+
+def calculate_entity_score(query_entities: List[Tuple[str, str]], doc_entities_lower: Dict[str, Collection[str]]) -> float:
+    """Calculate similarity score based on matching entities (query entities as lowercased (text, category) pairs)."""
+    if not query_entities or not doc_entities_lower:
         return 0.0
     
     score = 0.0
-    for query_entity in query_entities:
-        query_text = query_entity["text"].lower()
-        query_category = query_entity["category"]
-        
+    for query_text, query_category in query_entities:
         # Check if the entity exists in the same category
-        if query_category in doc_entities:
-            doc_entities_in_category = [e.lower() for e in doc_entities[query_category]]
-            if query_text in doc_entities_in_category:
-                score += 1.0  # Direct match in same category
-            else:
-                # Check for partial matches
-                for doc_entity in doc_entities_in_category:
-                    if query_text in doc_entity or doc_entity in query_text:
-                        score += 0.5  # Partial match
+        doc_entities_in_category = doc_entities_lower.get(query_category)
+        if not doc_entities_in_category:
+            continue
+        if query_text in doc_entities_in_category:
+            score += 1.0  # Direct match in same category
+            continue
+        # Check for partial matches (only when there is no exact match)
+        for doc_entity in doc_entities_in_category:
+            if query_text in doc_entity or doc_entity in query_text:
+                score += 0.5  # Partial match
     
     return score / len(query_entities)  # Normalize score
 
+# -----------------------------------------------
+# 🔹 Function: Re-rank Vector Hits with Entities
+# -----------------------------------------------
+
+@lru_cache(maxsize=64)
+def build_prefetch_params(ef_search: int) -> SearchParams:
+    """Parameters of the quantized-only first pass of `search_documents` (rescored afterwards by the main query)."""
+    return SearchParams(
+        hnsw_ef=ef_search,
+        quantization=QuantizationSearchParams(ignore=False, rescore=False)
+    )
+
+# The main query rescores the prefetched candidates with the original vectors
+FULL_PRECISION_PARAMS = SearchParams(quantization=QuantizationSearchParams(ignore=True))
+
+def build_query_request(query_vector, ef_search: int) -> QueryRequest:
+    """Vector search for one query: quantized prefetch, then full-precision rescoring of the candidates."""
+    vector = np.asarray(query_vector, dtype=np.float32).tolist()  # Request models are pydantic: plain floats
+    return QueryRequest(
+        prefetch=Prefetch(query=vector, limit=PREFETCH_LIMIT, params=build_prefetch_params(ef_search)),
+        query=vector,
+        limit=20,  # Get more results initially for re-ranking
+        with_payload=["metadata"],  # Re-ranking only needs the metadata: texts are fetched for the top 10
+        with_vector=False,  # Scores come back from Qdrant, vectors never leave the server
+        score_threshold=0.0,
+        params=FULL_PRECISION_PARAMS
+    )
+
+def query_hits(collection_name: str, query_vectors, ef_search: int) -> List[List[Any]]:
+    """Runs the vector search of every query in one Qdrant round-trip (shared by single & batched search)."""
+    responses = client.query_batch_points(
+        collection_name=collection_name,
+        requests=[build_query_request(query_vector, ef_search) for query_vector in query_vectors]
+    )
+    return [response.points for response in responses]
+
+def rerank_hits(vector_results, query_entities: List[Dict[str, str]], language: str,
+                bm25_index: Optional[Dict[str, Any]] = None, query: str = "",
+                collection_name: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Combines vector similarity with entity matching (and BM25 if indexed) and returns the top 10 results.
+    With `collection_name`, hits were fetched without their text: it is retrieved for the top 10 only.
+    """
+    if not vector_results:
+        return []
+
+    # Cosine similarity is computed by Qdrant; only the fusion happens here, vectorized
+    # Query entities are lowercased once, not once per hit
+    query_entities_lower = [(e["text"].lower(), e["category"]) for e in query_entities]
+    # Scores stream straight into float32 arrays (no intermediate Python lists)
+    n_hits = len(vector_results)
+    vector_scores = np.fromiter((hit.score for hit in vector_results), dtype=np.float32, count=n_hits)
+    # Hits sharing no entity category with the query score 0 without entering the matching loop
+    query_categories = frozenset(category for _, category in query_entities_lower)
+    entity_scores = np.zeros(n_hits, dtype=np.float32)
+    if query_categories:
+        for i, hit in enumerate(vector_results):
+            metadata = hit.payload.get("metadata", {})
+            if not query_categories.isdisjoint(metadata.get("entities", {})):
+                entity_scores[i] = calculate_entity_score(query_entities_lower, hit_entities_lower(metadata))
+
+    # Average vector & entity scores when entities match, otherwise keep the vector score
+    combined_scores = np.where(entity_scores > 0, (vector_scores + entity_scores) / 2, vector_scores)
+
+    # Blend in BM25 keyword scores of the hits (only the hit documents are scored, not the whole corpus)
+    bm25_scores = np.zeros(n_hits, dtype=np.float32)
+    if bm25_index:
+        positions = [bm25_index["positions"].get(hit.id) for hit in vector_results]
+        known = [i for i, position in enumerate(positions) if position is not None]
+        if known:
+            bm25_scores[known] = bm25_index["bm25"].get_batch_scores(
+                tokenize_text(query, language), [positions[i] for i in known]
+            )
+            if bm25_scores.max() > 0:
+                bm25_scores /= bm25_scores.max()
+            combined_scores = (1 - BM25_WEIGHT) * combined_scores + BM25_WEIGHT * bm25_scores
+
+    # Select the top 10 in O(n), then order only those (result dicts are built for them alone)
+    top_k = min(10, len(combined_scores))
+    top = np.argpartition(-combined_scores, top_k - 1)[:top_k]
+    order = top[np.argsort(-combined_scores[top], kind="stable")]
+
+    # Chunk texts of the winners only, in one round-trip
+    texts = {}
+    if collection_name:
+        texts = {
+            point.id: point.payload.get("text", "")
+            for point in client.retrieve(
+                collection_name=collection_name,
+                ids=[vector_results[i].id for i in order],
+                with_payload=["text"],
+                with_vectors=False
+            )
+        }
+
+    enhanced_results = []
+    for i in order:
+        hit = vector_results[i]
+        doc_metadata = hit.payload.get("metadata", {})
+        
+        enhanced_results.append({
+            "text": texts.get(hit.id, "") if collection_name else hit.payload.get("text", ""),
+            "score": float(combined_scores[i]),
+            "vector_score": hit.score,
+            "entity_score": float(entity_scores[i]),
+            "bm25_score": float(bm25_scores[i]),
+            "source": doc_metadata.get("source", "Unknown"),
+            "chunk_id": doc_metadata.get("chunk_id", 0),
+            "total_chunks": doc_metadata.get("total_chunks", 1),
+            "language": doc_metadata.get("language", language),
+            "matched_entities": doc_metadata.get("entities", {})
+        })
+
+    return enhanced_results
+
+# -----------------------------------------------
+# 🔹 Display View of Search Results
+# -----------------------------------------------
+
+class SourceView(NamedTuple):
+    """Display-ready search result, normalized once so renderers use attribute access only."""
+    source_name: str
+    language: str
+    text: str
+    score: float
+    entities_by_category: Tuple[Tuple[str, Tuple[str, ...]], ...]
+
+def to_source_view(result: Dict[str, Any]) -> SourceView:
+    """Normalizes a search result dict (source path, missing keys, entity dict) into a SourceView."""
+    return SourceView(
+        source_name=(result.get("source") or "Unknown").split("/")[-1],
+        language=result.get("language") or "unknown",
+        text=result.get("text") or "No content available",
+        score=result["score"],
+        entities_by_category=tuple(
+            (category, tuple(entities)) for category, entities in (result.get("matched_entities") or {}).items()
+        )
+    )
+
+# -----------------------------------------------
+# 🔹 Semantic Query Cache
+# -----------------------------------------------
+
+def query_cache_collection(language: str) -> str:
+    """Name of the Qdrant collection caching past query results for a language."""
+    return f"query_cache_{language}"
+
+@lru_cache(maxsize=None)
+def ensure_query_cache(language: str) -> str:
+    """Creates the query cache collection of a language (with its payload indexes) once per process."""
+    collection_name = query_cache_collection(language)
+    if not client.collection_exists(collection_name):
+        client.create_collection(
+            collection_name=collection_name,
+            vectors_config=VectorParams(size=EMBEDDING_SIZES[language], distance="Cosine")
+        )
+        # Every lookup filters on these fields and every sweep on "ts"
+        client.create_payload_index(collection_name, field_name="ef_search", field_schema="integer")
+        client.create_payload_index(collection_name, field_name="bm25", field_schema="bool")
+        client.create_payload_index(collection_name, field_name="ts", field_schema="float")
+    return collection_name
+
+# Last expiry sweep per query cache collection (time.monotonic)
+_last_query_cache_sweep: Dict[str, float] = {}
+
+def lookup_cached_results(query_vector, language: str, ef_search: int, bm25: bool) -> Optional[List[Dict[str, Any]]]:
+    """Returns the results of a fresh, near-identical earlier query (same ef_search & BM25 use), or None on a miss."""
+    try:
+        hits = client.query_points(
+            collection_name=ensure_query_cache(language),
+            query=list(map(float, query_vector)),
+            query_filter=Filter(must=[
+                FieldCondition(key="ef_search", match=MatchValue(value=ef_search)),
+                FieldCondition(key="bm25", match=MatchValue(value=bm25)),
+                FieldCondition(key="ts", range=Range(gte=time.time() - SEMANTIC_CACHE_TTL))
+            ]),
+            limit=1,
+            with_payload=["results"],
+            score_threshold=SEMANTIC_CACHE_THRESHOLD
+        ).points
+        return hits[0].payload["results"] if hits else None
+    except Exception as e:
+        print(f"Query cache lookup error: {e}")
+        ensure_query_cache.cache_clear()  # The collection may have been dropped by the indexer: recreate it next time
+        return None
+
+def store_cached_results(query: str, query_vector, language: str, ef_search: int, bm25: bool,
+                         results: List[Dict[str, Any]]) -> None:
+    """Caches the results of a query; entries older than SEMANTIC_CACHE_TTL are swept every SEMANTIC_CACHE_SWEEP_INTERVAL."""
+    try:
+        collection_name = ensure_query_cache(language)
+        client.upsert(
+            collection_name=collection_name,
+            points=[PointStruct(
+                id=str(uuid.uuid5(QUERY_CACHE_NAMESPACE, f"{ef_search}:{bm25}:{normalize_query(query)}")),
+                vector=list(map(float, query_vector)),
+                payload={"results": results, "ef_search": ef_search, "bm25": bm25, "ts": time.time()}
+            )],
+            wait=False
+        )
+
+        now = time.monotonic()
+        if now - _last_query_cache_sweep.get(collection_name, 0.0) >= SEMANTIC_CACHE_SWEEP_INTERVAL:
+            _last_query_cache_sweep[collection_name] = now
+            client.delete(
+                collection_name=collection_name,
+                points_selector=FilterSelector(filter=Filter(must=[
+                    FieldCondition(key="ts", range=Range(lt=time.time() - SEMANTIC_CACHE_TTL))
+                ])),
+                wait=False
+            )
+    except Exception as e:
+        print(f"Query cache update error: {e}")
+        ensure_query_cache.cache_clear()
+
 # -----------------------------------------------
 # 🔹 Function: Search Documents with Hybrid Retrieval
 # -----------------------------------------------
 
-def search_documents(query: str, language: str) -> List[Dict[str, Any]]:
+def search_documents(query: str, language: str, ollama_client: Optional[ollama.Client] = None,
+                     ef_search: int = HNSW_EF_SEARCH, bm25_index: Optional[Dict[str, Any]] = None,
+                     query_vector: Optional[Sequence[float]] = None) -> List[Dict[str, Any]]:
     """
-    Enhanced search using both vector similarity and entity matching.
+    Enhanced search using vector similarity, entity matching and (with a prebuilt index) BM25.
+    Pass `query_vector` when the query is already embedded so it isn't embedded again.
     """
-    # Extract entities from the query
-    query_entities = extract_entities(query, language)
-    print(f"\n🔍 Query Entities: {[f'{e['text']} ({e['category']})' for e in query_entities]}")
-    
-    # Generate query vector
-    query_vector = generate_embedding(query, language)
+    # Extract entities from the query in the background, overlapping the embedding & vector search round-trips
+    entities_future = query_pool.submit(extract_entities, query, language)
+
+    # Generate query vector (the only embedding call per query: document vectors stay in Qdrant)
+    if query_vector is None:
+        query_vector = generate_embedding(query, language, ollama_client)
     collection_name = "rag_docs_ar" if language == "arabic" else "rag_docs_en"
 
     if not client.collection_exists(collection_name):
         print(f"Collection '{collection_name}' not found")
+        entities_future.cancel()
         return []
 
+    # A near-duplicate earlier query skips entity scoring, search and re-ranking altogether
+    if SEMANTIC_CACHE_ENABLED:
+        cached_results = lookup_cached_results(query_vector, language, ef_search, bool(bm25_index))
+        if cached_results is not None:
+            entities_future.cancel()
+            return cached_results
+
     try:
         # Get initial results using vector search
-        vector_results = client.search(
-            collection_name=collection_name,
-            query_vector=query_vector,
-            limit=20,  # Get more results initially for re-ranking
-            with_payload=True,
-            score_threshold=0.0
-        )
+        vector_results = query_hits(collection_name, [query_vector], ef_search)[0]
+
+        query_entities = entities_future.result()
+        print(f"\n🔍 Query Entities: {[e['text'] + ' (' + e['category'] + ')' for e in query_entities]}")
 
         # Process and re-rank results
-        enhanced_results = []
-        for hit in vector_results:
-            doc_text = hit.payload.get("text", "")
-            doc_metadata = hit.payload.get("metadata", {})
-            doc_entities = doc_metadata.get("entities", {})
-            
-            # Calculate entity matching score
-            entity_score = calculate_entity_score(query_entities, doc_entities)
-            
-            # Combine vector similarity with entity score
-            combined_score = (hit.score + entity_score) / 2 if entity_score > 0 else hit.score
-            
-            enhanced_results.append({
-                "text": doc_text,
-                "score": combined_score,
-                "vector_score": hit.score,
-                "entity_score": entity_score,
-                "source": doc_metadata.get("source", "Unknown"),
-                "chunk_id": doc_metadata.get("chunk_id", 0),
-                "total_chunks": doc_metadata.get("total_chunks", 1),
-                "language": doc_metadata.get("language", language),
-                "matched_entities": doc_entities
-            })
-
-        # Sort by combined score
-        enhanced_results.sort(key=lambda x: x["score"], reverse=True)
-        
-        # Return top 10 results
-        return enhanced_results[:10]
+        results = rerank_hits(vector_results, query_entities, language, bm25_index, query, collection_name)
+        if SEMANTIC_CACHE_ENABLED and results:
+            store_cached_results(query, query_vector, language, ef_search, bool(bm25_index), results)
+        return results
 
     except Exception as e:
         print(f"Search error: {e}")
         return []
 
+def search_documents_batch(queries: List[str], language: str, ollama_client: Optional[ollama.Client] = None,
+                           ef_search: int = HNSW_EF_SEARCH,
+                           bm25_index: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+    """
+    Searches several queries of the same language in a single Qdrant round-trip (one result list per query).
+    Ranks exactly like `search_documents`: same vector search, semantic cache, re-ranking and text retrieval.
+    """
+    collection_name = "rag_docs_ar" if language == "arabic" else "rag_docs_en"
+
+    if not client.collection_exists(collection_name):
+        print(f"Collection '{collection_name}' not found")
+        return [[] for _ in queries]
+
+    # Entities are extracted concurrently, overlapping the batched embedding request
+    entity_futures = [query_pool.submit(extract_entities, query, language) for query in queries]
+    query_vectors = generate_embeddings_batch([normalize_query(query) for query in queries], language, ollama_client)
+    bm25 = bool(bm25_index)
+
+    # Near-duplicates of earlier queries are answered from the semantic cache, like in search_documents
+    results = [None] * len(queries)
+    if SEMANTIC_CACHE_ENABLED:
+        for i, query_vector in enumerate(query_vectors):
+            results[i] = lookup_cached_results(query_vector, language, ef_search, bm25)
+            if results[i] is not None:
+                entity_futures[i].cancel()
+    missing = [i for i, cached in enumerate(results) if cached is None]
+
+    try:
+        if missing:
+            batch_hits = query_hits(collection_name, [query_vectors[i] for i in missing], ef_search)
+            for i, hits in zip(missing, batch_hits):
+                results[i] = rerank_hits(hits, entity_futures[i].result(), language, bm25_index, queries[i], collection_name)
+                if SEMANTIC_CACHE_ENABLED and results[i]:
+                    store_cached_results(queries[i], query_vectors[i], language, ef_search, bm25, results[i])
+        return results
+
+    except Exception as e:
+        print(f"Batch search error: {e}")
+        return [[] for _ in queries]
+
 # -----------------------------------------------
 # 🔹 Function: Clean AI Response & Apply Arabic Formatting
 # -----------------------------------------------
 
+# RTL container for Arabic responses (built once, filled with str.format)
+ARABIC_RESPONSE_TEMPLATE = (
+    '<div dir="rtl" style="text-align: right; direction: rtl; unicode-bidi: embed; font-size: 20px; '
+    'line-height: 2.2; font-family: Arial, sans-serif;">{}</div>'
+)
+
+# Compiled once: HTML tags are stripped from every response
+_HTML_TAG_RE = re.compile(r'<.*?>')
+
+# Arabic responses are rewritten in one regex pass (after tags are stripped): bullets become "◼",
+# list markers get Arabic numerals and new lines become <br>. Only standalone markers are converted:
+# digits inside numbers ("2021.", "11.", "1.5") are left alone, unlike the original chained str.replace calls
+_ARABIC_SUBSTITUTIONS = {
+    "  *": "◼", "•": "◼", "-": "◼", "*": "◼",
+    "1.": "١.", "2.": "٢.", "3.": "٣.", "4.": "٤.", "5.": "٥.",
+    "\n": "<br>",
+}
+_ARABIC_CLEANUP_RE = re.compile(r'  \*|[•\-*\n]|(?<!\d)[1-5]\.(?!\d)')
+
+def _arabic_substitution(match: "re.Match[str]") -> str:
+    """Replacement for one `_ARABIC_CLEANUP_RE` match."""
+    return _ARABIC_SUBSTITUTIONS[match.group(0)]
+
 def clean_ai_response(text, language):
     """Cleans AI-generated responses and ensures proper right-to-left (RTL) formatting for Arabic."""
 
-    # Remove unwanted HTML tags
-    text = re.sub(r'<.*?>', '', text)
+    # Remove unwanted HTML tags first, so markers split by tags ("1<b>.</b>") are still recognized
+    if "<" in text:
+        text = _HTML_TAG_RE.sub('', text)
 
     if language == "arabic":
-        # ✅ Ensure proper Arabic bullets
-        text = text.replace("•", "◼").replace("-", "◼")  
-        text = text.replace("  *", "◼").replace("*", "◼")  
-
-        # ✅ Convert numbers to Arabic numerals
-        text = text.replace("1.", "١.").replace("2.", "٢.").replace("3.", "٣.").replace("4.", "٤.").replace("5.", "٥.")
+        # ✅ Use Arabic bullets & numerals and preserve new lines in a single pass
+        text = _ARABIC_CLEANUP_RE.sub(_arabic_substitution, text)
 
         # ✅ Enforce strict right alignment and better spacing
-        text = text.replace("\n", "<br>")  # Preserve new lines
-        text = f'<div dir="rtl" style="text-align: right; direction: rtl; unicode-bidi: embed; font-size: 20px; line-height: 2.2; font-family: Arial, sans-serif;">{text}</div>'
+        text = ARABIC_RESPONSE_TEMPLATE.format(text)
 
     return text
 
 # -----------------------------------------------
-# 🔹 Function: Generate AI Response
+# 🔹 Function: Warm Up Response Models
 # -----------------------------------------------
 
-def generate_response(query, max_length=512, temperature=0.9, top_k=40, repetition_penalty=1.0):
-    """Generates a response using the appropriate LLM model based on detected language."""
-    
-    language = detect_language(query)
-    model_name = "gemma3:1b" if language == "arabic" else "phi4-mini:3.8b"
+async def warm_up_model(language: str) -> None:
+    """Loads the response model for the language into Ollama memory (empty prompt, no tokens generated)."""
+    model_name = LLM_MODELS.get(language, LLM_MODELS["english"])
+    try:
+        # Closed after use: each search runs in its own event loop, so one shared async client can't be reused
+        async with ollama.AsyncClient(host=OLLAMA_HOST) as async_client:
+            await async_client.generate(model=model_name, prompt="", keep_alive=OLLAMA_KEEP_ALIVE)
+    except Exception as e:
+        print(f"⚠️ Model warm-up error: {e}")
 
-    if language == "arabic":
-        prompt = f"""
+def warm_up_models(ollama_client: Optional[ollama.Client] = None) -> None:
+    """Loads every response model with a 1-token completion so the first query skips the cold start."""
+    ollama_client = ollama_client or default_ollama_client
+    for model_name in LLM_MODELS.values():
+        try:
+            ollama_client.generate(model=model_name, prompt=" ", options={"num_predict": 1}, keep_alive=OLLAMA_KEEP_ALIVE)
+        except Exception as e:
+            print(f"⚠️ Model warm-up error ({model_name}): {e}")
+
+# -----------------------------------------------
+# 🔹 Function: Generate AI Response
+# -----------------------------------------------
+
+# Prompt templates built once and filled with str.format per query
+ARABIC_CONTEXT_TEMPLATE = """
+        المعلومات المتاحة:
+        {context}
+        """
+ARABIC_PROMPT_TEMPLATE = """
         أنت مساعد ذكي متخصص باللغة العربية. يجب أن تجيب باللغة العربية الفصحى فقط.
         لا تستخدم أي كلمات إنجليزية أو رموز غير عربية.
-        
+        {context_block}
         السؤال: {query}
         
         قواعد الإجابة:
@@ -287,21 +833,58 @@ def generate_response(query, max_length=512, temperature=0.9, top_k=40, repetiti
         ٥. اكتب إجابة كاملة ومفصلة
         ٦. استخدم الأرقام العربية (١، ٢، ٣) بدلاً من الأرقام الإنجليزية
         """
+ENGLISH_CONTEXT_TEMPLATE = "Use the following context to answer:\n\n{context}\n\n"
+ENGLISH_PROMPT_TEMPLATE = "{context_block}Answer the following question in clear, well-structured English:\n\n{query}"
+
+# Stop sequences shared by every chat request: prevent the model from continuing the conversation
+STOP_SEQUENCES = ["</s>", "user:", "assistant:"]
+
+def build_prompt(query: str, results: Optional[List[Dict[str, Any]]], language: str) -> str:
+    """Builds the language-specific prompt, grounded on the top retrieved documents if given."""
+    # Top-ranked chunks become the LLM context
+    context = "\n\n".join(doc["text"] for doc in (results or [])[:MAX_CONTEXT_DOCS])
+
+    if language == "arabic":
+        context_template, prompt_template = ARABIC_CONTEXT_TEMPLATE, ARABIC_PROMPT_TEMPLATE
     else:
-        prompt = f"Answer the following question in clear, well-structured English:\n\n{query}"
+        context_template, prompt_template = ENGLISH_CONTEXT_TEMPLATE, ENGLISH_PROMPT_TEMPLATE
+    context_block = context_template.format(context=context) if context else ""
+    return prompt_template.format(context_block=context_block, query=query)
+
+def generate_response_stream(query, results: Optional[List[Dict[str, Any]]] = None, language: Optional[str] = None,
+                             max_length=512, temperature=0.9, top_k=40, repetition_penalty=1.0,
+                             ollama_client: Optional[ollama.Client] = None) -> Iterator[str]:
+    """Streams the raw LLM response as it is generated (no cleaning or RTL formatting)."""
+    ollama_client = ollama_client or default_ollama_client
+    
+    language = language or detect_language(query)
+    model_name = LLM_MODELS.get(language, LLM_MODELS["english"])
 
-    response = ollama.chat(
+    stream = ollama_client.chat(
         model=model_name,
-        messages=[{"role": "user", "content": prompt}],
+        messages=[{"role": "user", "content": build_prompt(query, results, language)}],
+        stream=True,
+        keep_alive=OLLAMA_KEEP_ALIVE,
         options={
             "temperature": temperature,
             "top_k": top_k,
             "max_length": max_length,
             "repetition_penalty": repetition_penalty,
-            "stop": ["</s>", "user:", "assistant:"]  # Prevent model from continuing conversation
+            "stop": STOP_SEQUENCES  # Prevent model from continuing conversation
         }
     )
 
+    for chunk in stream:
+        yield chunk["message"]["content"]
+
+def generate_response(query, results: Optional[List[Dict[str, Any]]] = None, language: Optional[str] = None,
+                      max_length=512, temperature=0.9, top_k=40, repetition_penalty=1.0,
+                      ollama_client: Optional[ollama.Client] = None):
+    """Generates a complete response using the appropriate LLM model, grounded on the retrieved documents if given."""
+    language = language or detect_language(query)
+    response_text = "".join(generate_response_stream(
+        query, results, language, max_length, temperature, top_k, repetition_penalty, ollama_client
+    ))
+
     # Clean and format the response
-    response_text = response["message"]["content"]
-    return clean_ai_response(response_text, language)
\ No newline at end of file
+    return clean_ai_response(response_text, language)
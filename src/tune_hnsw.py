@@ -0,0 +1,154 @@
+import os
+import sys
+import time
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.models import (
+    PointStruct, HnswConfigDiff, OptimizersConfigDiff, SearchParams, QuantizationSearchParams, Prefetch,
+    Filter, HasIdCondition
+)
+from dotenv import load_dotenv
+from typing import List, Dict, Any
+
+# Load environment variables
+load_dotenv()
+
+# ================================
+# 🔹 CONFIGURATION
+# ================================
+
+QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
+QDRANT_API_KEY = os.getenv("QDRANT_API_KEY", None)
+
+# Grid explored by the sweep
+M_VALUES = (16, 24, 32)
+EF_CONSTRUCT_VALUES = (64, 128, 200)
+EF_SEARCH_VALUES = (40, 80, 120, 200)
+
+TOP_K = 10
+NUM_QUERIES = int(os.getenv("SWEEP_QUERIES", "100"))
+
+# Same quantized prefetch depth as the retriever's search_documents
+PREFETCH_LIMIT = int(os.getenv("PREFETCH_LIMIT", "100"))
+
+# Exact full-precision search, used as the ground truth
+EXACT_PARAMS = SearchParams(exact=True, quantization=QuantizationSearchParams(ignore=True))
+
+client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
+
+# ================================
+# 🔹 HELPERS
+# ================================
+
+def load_points(collection_name: str) -> List[PointStruct]:
+    """Reads every point (with its vector) from an indexed collection."""
+    points = []
+    offset = None
+    while True:
+        batch, offset = client.scroll(collection_name, limit=256, offset=offset, with_vectors=True)
+        points.extend(PointStruct(id=p.id, vector=p.vector, payload={}) for p in batch)
+        if offset is None:
+            return points
+
+def build_collection(name: str, source: str, points: List[PointStruct], m: int, ef_construct: int) -> None:
+    """
+    Creates a temporary copy of the points with the given HNSW parameters and waits for the index.
+    Vector storage (datatype, on-disk) and quantization are copied from the source, so the copy searches like production.
+    """
+    if client.collection_exists(name):
+        client.delete_collection(name)
+    source_config = client.get_collection(source).config
+    client.create_collection(
+        collection_name=name,
+        vectors_config=source_config.params.vectors,
+        hnsw_config=HnswConfigDiff(m=m, ef_construct=ef_construct, on_disk=False),
+        quantization_config=source_config.quantization_config,
+        optimizers_config=OptimizersConfigDiff(indexing_threshold=1)  # Force HNSW even for small sets
+    )
+    for start in range(0, len(points), 256):
+        client.upsert(collection_name=name, points=points[start:start + 256])
+
+    while client.get_collection(name).status != "green":
+        time.sleep(0.5)
+
+def search(name: str, query: List[float], ef_search: int) -> List[Any]:
+    """Searches like the retriever: quantized prefetch with ef_search, then full-precision rescoring."""
+    return client.query_points(
+        collection_name=name,
+        prefetch=Prefetch(
+            query=query,
+            limit=PREFETCH_LIMIT,
+            params=SearchParams(hnsw_ef=ef_search, quantization=QuantizationSearchParams(ignore=False, rescore=False))
+        ),
+        query=query,
+        limit=TOP_K,
+        search_params=SearchParams(quantization=QuantizationSearchParams(ignore=True))
+    ).points
+
+def measure(name: str, queries: List[List[float]], truth: List[set], ef_search: int) -> Dict[str, float]:
+    """Returns recall@TOP_K against exact search and the P95 latency for one ef_search value."""
+    recalls, latencies = [], []
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        hits = search(name, query, ef_search)
+        latencies.append((time.perf_counter() - started) * 1000)
+        recalls.append(len(expected & {hit.id for hit in hits}) / max(len(expected), 1))
+    return {"recall": float(np.mean(recalls)), "p95_ms": float(np.percentile(latencies, 95))}
+
+def pareto_front(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Keeps the settings that no other setting beats on both recall and P95 latency."""
+    return [
+        row for row in rows
+        if not any(
+            other["recall"] >= row["recall"] and other["p95_ms"] <= row["p95_ms"] and other is not row
+            and (other["recall"] > row["recall"] or other["p95_ms"] < row["p95_ms"])
+            for other in rows
+        )
+    ]
+
+# ================================
+# 🔹 MAIN EXECUTION
+# ================================
+
+if __name__ == "__main__":
+    source = sys.argv[1] if len(sys.argv) > 1 else "rag_docs_en"
+    points = load_points(source)
+    if not points:
+        print(f"⚠️ Collection '{source}' is empty. Index documents first.")
+        exit()
+    if len(points) < 2 or NUM_QUERIES < 1:
+        print(f"⚠️ Collection '{source}' needs at least 2 points (and SWEEP_QUERIES >= 1): half at most are held out as queries.")
+        exit()
+
+    # Sampled stored vectors are held out as queries: they aren't copied, so no query can find itself
+    rng = np.random.default_rng(0)
+    sample = set(rng.choice(len(points), size=min(NUM_QUERIES, len(points) // 2), replace=False).tolist())
+    queries = [points[i].vector for i in sorted(sample)]
+    held_out = [points[i].id for i in sorted(sample)]
+    corpus = [point for i, point in enumerate(points) if i not in sample]
+
+    # Exact full-precision search over the same corpus (held-out points excluded) gives the ground truth
+    exclude_queries = Filter(must_not=[HasIdCondition(has_id=held_out)])
+    truth = [
+        {hit.id for hit in client.query_points(
+            source, query=q, limit=TOP_K, query_filter=exclude_queries, search_params=EXACT_PARAMS
+        ).points}
+        for q in queries
+    ]
+
+    rows = []
+    temp_name = f"{source}_hnsw_sweep"
+    for m in M_VALUES:
+        for ef_construct in EF_CONSTRUCT_VALUES:
+            print(f"🔧 Building m={m}, ef_construct={ef_construct}...")
+            build_collection(temp_name, source, corpus, m, ef_construct)
+            for ef_search in EF_SEARCH_VALUES:
+                result = measure(temp_name, queries, truth, ef_search)
+                rows.append({"m": m, "ef_construct": ef_construct, "ef_search": ef_search, **result})
+                print(f"   ef_search={ef_search}: recall@{TOP_K}={result['recall']:.3f}, P95={result['p95_ms']:.1f} ms")
+    client.delete_collection(temp_name)
+
+    print("\n✅ Pareto-optimal settings (recall@10 vs P95 latency):")
+    for row in sorted(pareto_front(rows), key=lambda r: r["p95_ms"]):
+        print(f"- HNSW_M={row['m']} HNSW_EF_CONSTRUCT={row['ef_construct']} HNSW_EF_SEARCH={row['ef_search']}: "
+              f"recall={row['recall']:.3f}, P95={row['p95_ms']:.1f} ms")
@@ -1,6 +1,6 @@
 import os
 import json
-from src.retriever import search_documents, generate_response, detect_language
+from src.retriever import search_documents, generate_response, detect_language, generate_embeddings_batch, normalize_query
 
 # Ensure results folder exists
 os.makedirs("results", exist_ok=True)
@@ -16,12 +16,20 @@ TEST_QUERIES = [
     {"query": "ما هي الاتجاهات المستقبلية للذكاء الاصطناعي في الرعاية الصحية؟", "expected_lang": "arabic"},
 ]
 
+print("\n🔍 Running AI Response Tests...\n")
+
+# 🧠 Embed the test queries in one request per language, normalized exactly as search_documents does
+query_vectors = [None] * len(TEST_QUERIES)
+for language in {test["expected_lang"] for test in TEST_QUERIES}:
+    indexes = [i for i, test in enumerate(TEST_QUERIES) if test["expected_lang"] == language]
+    vectors = generate_embeddings_batch([normalize_query(TEST_QUERIES[i]["query"]) for i in indexes], language)
+    for i, vector in zip(indexes, vectors):
+        query_vectors[i] = vector
+
 # 📂 Store results
 results = []
 
-print("\n🔍 Running AI Response Tests...\n")
-
-for test in TEST_QUERIES:
+for test, query_vector in zip(TEST_QUERIES, query_vectors):
     query_text = test["query"]
     expected_lang = test["expected_lang"]
 
@@ -30,11 +38,11 @@ for test in TEST_QUERIES:
     assert detected_lang == expected_lang, f"❌ Mismatch! Expected {expected_lang}, detected {detected_lang}"
 
     # 🔎 Retrieve Documents
-    retrieved_docs = search_documents(query_text, detected_lang)
+    retrieved_docs = search_documents(query_text, detected_lang, query_vector=query_vector)
     retrieved_texts = [doc["text"] for doc in retrieved_docs]
 
     # 🤖 Generate AI Response
-    ai_response = generate_response(query_text)
+    ai_response = generate_response(query_text, retrieved_docs, language=detected_lang)
 
     # 📝 Save Test Result
     result = {
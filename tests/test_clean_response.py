@@ -0,0 +1,36 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+# The retriever checks its Azure settings at import; these tests never call Azure
+os.environ.setdefault("AZURE_LANGUAGE_ENDPOINT", "http://localhost:5000")
+os.environ.setdefault("AZURE_LANGUAGE_KEY", "test")
+
+import pytest
+from retriever import clean_ai_response, ARABIC_RESPONSE_TEMPLATE
+
+def arabic(text):
+    return ARABIC_RESPONSE_TEMPLATE.format(text)
+
+# Test HTML stripping
+def test_strips_html_tags():
+    assert clean_ai_response("<p>Hello <b>world</b></p>", "english") == "Hello world"
+    assert clean_ai_response("مرحبا <i>بك</i>", "arabic") == arabic("مرحبا بك")
+
+def test_english_keeps_bullets_and_numbers():
+    assert clean_ai_response("1. first\n- second * third", "english") == "1. first\n- second * third"
+
+# Test Arabic bullets, numerals & new lines
+def test_arabic_bullets():
+    assert clean_ai_response("• أ\n- ب\n  * ج\n* د", "arabic") == arabic("◼ أ<br>◼ ب<br>◼ ج<br>◼ د")
+
+def test_arabic_list_markers():
+    assert clean_ai_response("1. أولا\n2. ثانيا\n5. خامسا", "arabic") == arabic("١. أولا<br>٢. ثانيا<br>٥. خامسا")
+
+def test_arabic_marker_split_by_tags():
+    assert clean_ai_response("1<b>.</b> أولا", "arabic") == arabic("١. أولا")
+
+# Digits inside numbers are not list markers (the original chained replaces turned "2021." into "202١.")
+@pytest.mark.parametrize("text", ["سنة 2021.", "1.5", "11.", "6. سادسا"])
+def test_arabic_numbers_left_intact(text):
+    assert clean_ai_response(text, "arabic") == arabic(text)
@@ -0,0 +1,70 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+# The indexer & retriever check their Azure settings at import; these tests never call Azure
+os.environ.setdefault("AZURE_LANGUAGE_ENDPOINT", "http://localhost:5000")
+os.environ.setdefault("AZURE_LANGUAGE_KEY", "test")
+
+import pytest
+from indexer import chunk_text, point_id
+from language_utils import is_arabic_fast
+from retriever import tokenize_text, calculate_entity_score
+
+# Test chunking
+def test_chunk_empty_input():
+    assert chunk_text("") == []
+    assert chunk_text("   \n ") == []
+
+def test_chunk_short_text_is_one_chunk():
+    assert chunk_text("hello world", size=100, overlap=10) == ["hello world"]
+
+def test_chunks_overlap_and_cut_at_spaces():
+    words = [f"w{i:03d}" for i in range(200)]
+    chunks = chunk_text(" ".join(words), size=100, overlap=20)
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert len(chunk) <= 100
+        assert all(word in words for word in chunk.split())  # No word is cut in half
+    for previous, current in zip(chunks, chunks[1:]):
+        assert current.split()[0] in previous.split()  # Consecutive chunks share text
+    assert chunks[0].split()[0] == words[0] and chunks[-1].split()[-1] == words[-1]
+
+def test_chunk_no_space_run():
+    text = "x" * 250
+    chunks = chunk_text(text, size=100, overlap=20)
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    assert chunks[0] == "x" * 100
+    assert len(chunks) == 3  # Windows start at 0, 80 & 160
+
+# Test point ids
+def test_point_id_is_deterministic_64_bit():
+    chunk = {"text": "نص", "metadata": {"language": "arabic", "source": "a.txt"}}
+    assert point_id(chunk) == point_id(dict(chunk))
+    assert 0 <= point_id(chunk) < 1 << 64
+    assert point_id(chunk) != point_id({**chunk, "metadata": {"language": "arabic", "source": "b.txt"}})
+
+# Test language triage
+@pytest.mark.parametrize("text, expected", [
+    ("Plain English text", False),
+    ("مرحبا بكم في النظام", True),
+    ("café naïve résumé", False),
+    ("Hello مرحبا", None),
+    ("   ", False),
+])
+def test_is_arabic_fast(text, expected):
+    assert is_arabic_fast(text) is expected
+
+# Test BM25 tokenization
+def test_tokenize_text():
+    assert tokenize_text("Hello, World! AI_ops 2024", "english") == ["hello", "world", "ai", "ops", "2024"]
+    assert tokenize_text("الذكاءُ الاصطناعي؟", "arabic") == ["الذكاءُ", "الاصطناعي"]
+
+# Test entity scoring
+def test_calculate_entity_score():
+    doc = {"organization": {"microsoft", "openai"}, "location": {"seattle"}}
+    assert calculate_entity_score([], doc) == 0.0
+    assert calculate_entity_score([("microsoft", "organization")], {}) == 0.0
+    assert calculate_entity_score([("microsoft", "organization")], doc) == 1.0
+    assert calculate_entity_score([("open", "organization")], doc) == 0.5  # Partial match
+    assert calculate_entity_score([("seattle", "organization"), ("seattle", "location")], doc) == 0.5
@@ -0,0 +1,37 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+# The retriever checks its Azure settings at import; these tests never call Azure
+os.environ.setdefault("AZURE_LANGUAGE_ENDPOINT", "http://localhost:5000")
+os.environ.setdefault("AZURE_LANGUAGE_KEY", "test")
+
+import pytest
+from qdrant_client import QdrantClient
+import retriever
+from retriever import lookup_cached_results, store_cached_results, ensure_query_cache, EMBEDDING_SIZES
+
+RESULTS = [{"text": "AI improves diagnostics", "score": 0.9, "matched_entities": {}}]
+
+@pytest.fixture
+def memory_client(monkeypatch):
+    """Runs the semantic cache against an in-memory Qdrant instead of the server."""
+    monkeypatch.setattr(retriever, "client", QdrantClient(":memory:"))
+    ensure_query_cache.cache_clear()
+    yield retriever.client
+    ensure_query_cache.cache_clear()
+
+def vector(first: float = 1.0):
+    return [first] + [0.0] * (EMBEDDING_SIZES["english"] - 1)
+
+# Test a stored query is found again
+def test_store_then_lookup(memory_client):
+    store_cached_results("How is AI used?", vector(), "english", 128, False, RESULTS)
+    assert lookup_cached_results(vector(), "english", 128, False) == RESULTS
+
+# Test entries from other settings or dissimilar queries are not returned
+def test_lookup_misses(memory_client):
+    store_cached_results("How is AI used?", vector(), "english", 128, False, RESULTS)
+    assert lookup_cached_results(vector(), "english", 64, False) is None
+    assert lookup_cached_results(vector(), "english", 128, True) is None
+    assert lookup_cached_results(vector(-1.0), "english", 128, False) is None
@@ -1,4 +1,4 @@
-from src.retriever import search_documents, detect_language
+from src.retriever import search_documents, search_documents_batch, detect_language
 
 # Sample Queries
 queries = [
@@ -8,12 +8,7 @@ queries = [
     "ما هي المخاوف الأخلاقية حول استخدام الذكاء الاصطناعي في الطب؟"  # Non-Indexed Query (Arabic)
 ]
 
-print("\n🔍 Running Retriever Tests...\n")
-
-for query in queries:
-    detected_language = detect_language(query)
-    retrieved_docs = search_documents(query, detected_language)
-
+def print_results(query, detected_language, retrieved_docs):
     print(f"📌 Query: {query}")
     print(f"🌍 Detected Language: {detected_language}")
     
@@ -24,4 +19,30 @@ for query in queries:
     else:
         print("⚠️ No relevant documents found!")
 
-    print("\n" + "="*80 + "\n")
\ No newline at end of file
+    print("\n" + "="*80 + "\n")
+
+print("\n🔍 Running Retriever Tests...\n")
+
+single_results = {}
+for query in queries:
+    detected_language = detect_language(query)
+    retrieved_docs = search_documents(query, detected_language)
+    single_results[query] = retrieved_docs
+    print_results(query, detected_language, retrieved_docs)
+
+print("\n🔍 Running Batched Retriever Tests...\n")
+
+# Group queries per language so each collection is searched in one batch
+queries_by_language = {}
+for query in queries:
+    queries_by_language.setdefault(detect_language(query), []).append(query)
+
+for detected_language, language_queries in queries_by_language.items():
+    batch_results = search_documents_batch(language_queries, detected_language)
+
+    for query, retrieved_docs in zip(language_queries, batch_results):
+        print_results(query, detected_language, retrieved_docs)
+
+        # Both paths share the same search & re-ranking, so they must agree
+        assert [doc["text"] for doc in retrieved_docs] == [doc["text"] for doc in single_results[query]], \
+            f"❌ Batched results differ from search_documents for: {query}"